@@ -0,0 +1,157 @@
+"""
+Content-addressed artifact store for intermediate pipeline results.
+Each stage output (prepared mesh, alignment, raw/smoothed weights) is keyed
+by a hash of its inputs plus the stage parameters, so a re-run only
+recomputes the stages downstream of whatever changed.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(__file__)
+ARTIFACT_DIR = os.path.join(BASE_DIR, 'artifacts')
+# Eviction bounds; artifacts used within IN_USE_GRACE seconds are never evicted
+ARTIFACT_MAX_BYTES = int(os.environ.get('ARTIFACT_MAX_BYTES', 5 * 1024 ** 3))
+ARTIFACT_MAX_AGE = int(os.environ.get('ARTIFACT_MAX_AGE', 7 * 24 * 3600))
+IN_USE_GRACE = 3600
+EVICT_INTERVAL = int(os.environ.get('ARTIFACT_EVICT_INTERVAL', 600))  # seconds between eviction passes
+HASH_CACHE_SIZE = 64   # memoized file hashes kept (LRU)
+
+_hash_cache = OrderedDict()
+_hash_lock = threading.Lock()
+
+def hash_file(path, block_size=1 << 20, memo=True):
+    """
+    SHA-256 of a file's contents.
+    Memoized on (path, size, mtime) in a small LRU so templates are only
+    hashed once per change; pass memo=False for one-off files such as uploads.
+    """
+    st = os.stat(path)
+    cache_key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        digest = _hash_cache.get(cache_key)
+        if digest is not None:
+            _hash_cache.move_to_end(cache_key)
+    if digest is not None:
+        return digest
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    if memo:
+        with _hash_lock:
+            _hash_cache[cache_key] = digest
+            while len(_hash_cache) > HASH_CACHE_SIZE:
+                _hash_cache.popitem(last=False)
+    return digest
+
+def artifact_key(*parts):
+    """Derive a stable key from JSON-serializable parts (hashes, versions, params)."""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ArtifactStore:
+    """Maps (stage, key) to a file path under a root directory."""
+
+    def __init__(self, root=ARTIFACT_DIR, evict_interval=EVICT_INTERVAL):
+        self.root = root
+        self.evict_interval = evict_interval
+        self._evictor = None
+        self._stop = threading.Event()
+
+    def path(self, stage, key, ext):
+        stage_dir = os.path.join(self.root, stage)
+        os.makedirs(stage_dir, exist_ok=True)
+        return os.path.join(stage_dir, f"{key}{ext}")
+
+    @staticmethod
+    def commit(src_path, dest_path):
+        """Atomically move a finished file into place."""
+        os.replace(src_path, dest_path)
+        return dest_path
+
+    @staticmethod
+    def touch(*paths):
+        """Mark existing artifacts as recently used (mtime drives eviction)."""
+        for path in paths:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self, max_bytes=ARTIFACT_MAX_BYTES, max_age=ARTIFACT_MAX_AGE, now=None):
+        """
+        Delete artifacts unused for longer than max_age, then the least
+        recently used ones until the store fits in max_bytes. Files used
+        within IN_USE_GRACE are kept, so running jobs never lose their inputs.
+        Returns (files removed, bytes freed).
+        """
+        now = time.time() if now is None else now
+        entries = []
+        for stage in os.scandir(self.root) if os.path.isdir(self.root) else ():
+            if not stage.is_dir():
+                continue
+            for entry in os.scandir(stage.path):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for mtime, size, path in entries:
+            age = now - mtime
+            if age < IN_USE_GRACE:
+                break
+            if age <= max_age and total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def start_evictor(self):
+        """Start the background eviction thread (idempotent)."""
+        if self._evictor is not None:
+            return
+        self._evictor = threading.Thread(target=self._evict_loop, name='artifact-evictor', daemon=True)
+        self._evictor.start()
+
+    def stop_evictor(self):
+        self._stop.set()
+
+    def _evict_loop(self):
+        while not self._stop.wait(self.evict_interval):
+            try:
+                removed, freed = self.evict()
+            except OSError:
+                logger.warning("Artifact eviction failed", exc_info=True)
+                continue
+            if removed:
+                logger.info(f"Evicted {removed} artifacts ({freed / 1024 ** 2:.1f} MB)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Evict old artifacts from the pipeline cache.")
+    parser.add_argument('--root', default=ARTIFACT_DIR)
+    parser.add_argument('--max-bytes', type=int, default=ARTIFACT_MAX_BYTES)
+    parser.add_argument('--max-age', type=int, default=ARTIFACT_MAX_AGE, help="seconds")
+    args = parser.parse_args()
+    removed, freed = ArtifactStore(args.root).evict(args.max_bytes, args.max_age)
+    print(f"Removed {removed} artifacts ({freed / 1024 ** 2:.1f} MB)")
+
+if __name__ == '__main__':
+    main()
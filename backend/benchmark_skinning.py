@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark bone-heat skinning against template weight transfer.
+
+Builds a synthetic limb: a chain of bones with a template mesh (straight
+cylinder, artist-style ramp weights at the joints) and a target mesh whose
+shape differs (bulging, bent centre line), then skins the target both ways
+with the same code paths rigger.py uses and reports:
+
+  seconds      wall time of the skinning step
+  sum_err      max |sum of a vertex's weights - 1|
+  energy       Dirichlet energy sum_j w_j^T L w_j (lower is smoother)
+  bleed        share of weight on bones not adjacent to the vertex's
+               nearest bone (lower is more local)
+
+Usage: python benchmark_skinning.py [--vertices 20000 200000] [--bones 6]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import bone_heat
+import correspondence
+import rig_math
+
+LIMB_LENGTH = 3.0
+TEMPLATE_RADIUS = 0.2
+JOINT_BLEND = 0.15   # half-width of the template's weight ramp at each joint
+
+def cylinder(n_vertices, radius_fn, centre_fn):
+    """Open tube along z with ~n_vertices; radius/centre vary with height."""
+    rings = max(4, int(np.sqrt(n_vertices * 2)))
+    around = max(8, n_vertices // rings)
+    theta = np.linspace(0, 2 * np.pi, around, endpoint=False)
+    z = np.linspace(0, LIMB_LENGTH, rings)
+    zz = np.repeat(z, around)
+    r = radius_fn(zz)
+    cx, cy = centre_fn(zz)
+    verts = np.c_[cx + r * np.tile(np.cos(theta), rings), cy + r * np.tile(np.sin(theta), rings), zz]
+    i = np.arange(rings - 1)[:, None] * around
+    j = np.arange(around)[None, :]
+    jn = (j + 1) % around
+    a, b, c, d = (i + j).ravel(), (i + jn).ravel(), (i + around + j).ravel(), (i + around + jn).ravel()
+    return verts, np.r_[np.c_[a, b, c], np.c_[b, d, c]].astype(np.int64)
+
+def bone_chain(n_bones):
+    joints = np.linspace(0, LIMB_LENGTH, n_bones + 1)
+    heads = np.c_[np.zeros(n_bones), np.zeros(n_bones), joints[:-1]]
+    tails = np.c_[np.zeros(n_bones), np.zeros(n_bones), joints[1:]]
+    return [f"bone_{k}" for k in range(n_bones)], heads, tails
+
+def ramp_weights(z, n_bones):
+    """Dense (n, n_bones) weights blending linearly across each joint."""
+    joints = np.linspace(0, LIMB_LENGTH, n_bones + 1)[1:-1]
+    # Cumulative "how far past joint k" in [0, 1], differenced into per-bone weights
+    past = np.clip((z[:, None] - joints[None, :] + JOINT_BLEND) / (2 * JOINT_BLEND), 0, 1)
+    upper = np.c_[np.ones(len(z)), past]
+    lower = np.c_[past, np.zeros(len(z))]
+    return upper - lower
+
+def template_transfer(template_verts, template_tris, template_weights, names, target_verts):
+    """The rigger's transfer_weights without bpy: nearest surface + barycentric blend."""
+    tri, bary = correspondence.nearest_surface(template_verts, template_tris, target_verts)
+    return rig_math.interpolate_weights(names, template_weights, template_tris[tri], bary)
+
+def quality(packed, verts, tris, heads, tails):
+    n = len(verts)
+    dense = np.stack([rig_math.group_weights(packed, g, n) for g in range(len(packed[0]))], axis=1)
+    L, _ = bone_heat.cotangent_laplacian(verts, tris)
+    nearest, _ = bone_heat.segment_distances(verts, heads, tails)
+    far = np.abs(np.arange(dense.shape[1])[None, :] - nearest[:, None]) >= 2
+    return {
+        'sum_err': float(np.abs(dense.sum(axis=1) - 1).max()),
+        'energy': float(np.einsum('ij,ij->', dense, L @ dense)),
+        'bleed': float(dense[far].sum() / max(dense.sum(), 1e-12)),
+    }
+
+def run(n_vertices, n_bones):
+    names, heads, tails = bone_chain(n_bones)
+    template_verts, template_tris = cylinder(
+        n_vertices, lambda z: np.full_like(z, TEMPLATE_RADIUS), lambda z: (0 * z, 0 * z))
+    template_weights = ramp_weights(template_verts[:, 2], n_bones)
+    # A heavier, slightly bent body than the template was painted for
+    target_verts, target_tris = cylinder(
+        n_vertices,
+        lambda z: TEMPLATE_RADIUS * (1.0 + 1.5 * np.sin(np.pi * z / LIMB_LENGTH) ** 2),
+        lambda z: (0.25 * np.sin(np.pi * z / LIMB_LENGTH), 0 * z))
+
+    results = {}
+    t0 = time.perf_counter()
+    packed = template_transfer(template_verts, template_tris, template_weights, names, target_verts)
+    results['template'] = (time.perf_counter() - t0, packed)
+    t0 = time.perf_counter()
+    packed = bone_heat.bone_heat_weights(target_verts, target_tris, names, heads, tails)
+    results['bone_heat'] = (time.perf_counter() - t0, packed)
+
+    for method, (seconds, packed) in results.items():
+        q = quality(packed, target_verts, target_tris, heads, tails)
+        print(f"{len(target_verts):>9} {method:>10} {seconds:>9.2f} "
+              f"{q['sum_err']:>9.1e} {q['energy']:>10.3f} {q['bleed']:>8.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--vertices', type=int, nargs='+', default=[20000, 200000])
+    parser.add_argument('--bones', type=int, default=6)
+    args = parser.parse_args()
+    if not bone_heat.available():
+        raise SystemExit("SciPy is required for bone-heat skinning.")
+    print(f"{'vertices':>9} {'method':>10} {'seconds':>9} {'sum_err':>9} {'energy':>10} {'bleed':>8}")
+    for n in args.vertices:
+        run(n, args.bones)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Bone-heat skinning (Baran & Popovic, "Automatic Rigging and Animation of
+3D Characters"): weights are computed from the aligned armature's bones
+instead of being copied from the template mesh.
+
+Each bone's weight w_j solves the screened diffusion problem
+
+    (L + M H) w_j = M H p_j
+
+where L is the cotangent Laplacian, M the lumped vertex area, H the "heat"
+c / d^2 of each vertex's distance to its nearest bone and p_j the indicator
+of the vertices whose nearest bone is j. The matrix is the same for every
+bone, so it is factorized once and all bones are solved against it in
+batches. Since sum_j p_j = 1 and L annihilates constants, the weights of a
+vertex sum to one without a normalization pass.
+
+Pure NumPy plus scipy.sparse; SciPy is optional (Blender does not bundle
+it) and `available()` reports whether this engine can run.
+"""
+
+import numpy as np
+
+import rig_math
+
+try:
+    import scipy.sparse as sp
+    import scipy.sparse.linalg as spla
+except ImportError:  # pragma: no cover - depends on the Python running us
+    sp = spla = None
+
+HEAT_CONSTANT = 1.0          # c in H = c / d^2
+MIN_DISTANCE_FRACTION = 1e-4  # distances clamp at this fraction of the bounding-box diagonal
+SOLVE_BATCH = 16             # bones solved per back-substitution
+
+def available():
+    """True if SciPy's sparse solvers can be imported."""
+    return spla is not None
+
+# ----------------------------------------------------------------------
+# Geometry
+# ----------------------------------------------------------------------
+def segment_distances(points, heads, tails):
+    """
+    Distance of each point to its nearest bone segment.
+    Returns (nearest bone index (n,), distance (n,)); bones are looped so
+    temporaries stay at a few (n, 3) arrays.
+    """
+    best = np.zeros(len(points), dtype=np.int64)
+    best_d2 = np.full(len(points), np.inf)
+    for j, (head, tail) in enumerate(zip(heads, tails)):
+        axis = tail - head
+        length2 = float(axis @ axis)
+        rel = points - head
+        t = np.clip(rel @ axis / length2, 0.0, 1.0) if length2 > 0 else np.zeros(len(points))
+        diff = rel - t[:, None] * axis
+        d2 = np.einsum('ij,ij->i', diff, diff)
+        closer = d2 < best_d2
+        best[closer] = j
+        best_d2[closer] = d2[closer]
+    return best, np.sqrt(best_d2)
+
+def cotangent_laplacian(verts, tris):
+    """
+    Cotangent stiffness matrix L (n, n, positive semi-definite) and lumped
+    vertex areas M (n,). Negative cotangents (obtuse angles) are clamped to
+    zero so L stays an M-matrix and the weights stay within [0, 1].
+    """
+    n = len(verts)
+    a, b, c = verts[tris[:, 0]], verts[tris[:, 1]], verts[tris[:, 2]]
+    double_area = np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    ok = double_area > 1e-12 * max(1.0, double_area.max(initial=0.0))
+    tris, a, b, c, double_area = tris[ok], a[ok], b[ok], c[ok], double_area[ok]
+
+    rows, cols, vals = [], [], []
+    # The angle at each corner weights the opposite edge
+    for (p, q, r), (i, j) in (((a, b, c), (1, 2)), ((b, c, a), (2, 0)), ((c, a, b), (0, 1))):
+        cot = np.einsum('ij,ij->i', q - p, r - p) / double_area
+        w = 0.5 * np.maximum(cot, 0.0)
+        rows += [tris[:, i], tris[:, j]]
+        cols += [tris[:, j], tris[:, i]]
+        vals += [-w, -w]
+    rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+    off = sp.coo_matrix((vals, (rows, cols)), shape=(n, n)).tocsr()
+    diagonal = -np.asarray(off.sum(axis=1)).ravel()
+    L = off + sp.diags(diagonal)
+
+    mass = np.bincount(tris.ravel(), np.repeat(double_area / 6.0, 3), minlength=n)
+    return L, mass
+
+# ----------------------------------------------------------------------
+# Solver
+# ----------------------------------------------------------------------
+def bone_heat_weights(verts, tris, names, heads, tails, heat=HEAT_CONSTANT, batch=SOLVE_BATCH,
+                      progress=None):
+    """
+    Bone-heat weights for a mesh (verts (n, 3), tris (m, 3)) and bone
+    segments (heads/tails (b, 3), same space as verts). Returns packed
+    weights with one group per bone name. `progress(done, total)` is called
+    after the factorization (done=0) and after each solved batch of bones.
+    """
+    if not available():
+        raise RuntimeError("Bone-heat skinning needs SciPy (scipy.sparse).")
+    verts = np.asarray(verts, dtype=np.float64)
+    heads = np.asarray(heads, dtype=np.float64)
+    tails = np.asarray(tails, dtype=np.float64)
+    if len(verts) == 0 or len(names) == 0:
+        raise ValueError("Bone-heat skinning needs vertices and at least one bone.")
+
+    nearest, distance = segment_distances(verts, heads, tails)
+    diagonal = float(np.linalg.norm(verts.max(axis=0) - verts.min(axis=0))) or 1.0
+    distance = np.maximum(distance, MIN_DISTANCE_FRACTION * diagonal)
+
+    L, mass = cotangent_laplacian(verts, tris)
+    # Loose vertices have no area: give them the mean one so they take their nearest bone
+    mass = np.where(mass > 0, mass, mass[mass > 0].mean() if np.any(mass > 0) else 1.0)
+    screen = mass * heat / (distance * distance)
+    # Symmetric positive definite: a symmetric ordering keeps the factor sparse
+    solver = spla.splu((L + sp.diags(screen)).tocsc(), permc_spec='MMD_AT_PLUS_A')
+    if progress:
+        progress(0, len(names))
+
+    def columns():
+        for start in range(0, len(names), batch):
+            bones = np.arange(start, min(start + batch, len(names)))
+            rhs = np.where(nearest[:, None] == bones[None, :], screen[:, None], 0.0)
+            solved = np.clip(solver.solve(rhs), 0.0, 1.0)
+            if progress:
+                progress(bones[-1] + 1, len(names))
+            for k in range(len(bones)):
+                yield solved[:, k]
+
+    return rig_math.pack_columns(names, columns())
@@ -9,6 +9,8 @@ import subprocess
 import sys
 import shutil
 
+import pipeline
+
 TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
 
 def check_blender():
@@ -78,17 +80,21 @@ print("Conversion successful")
 
     try:
         cmd = ['blender', '--background', '--python', script_path, '--', fbx_path, glb_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
-        if result.returncode != 0:
+        timeout = pipeline.estimate_timeout(fbx_path, 'convert')
+        returncode, _, stderr = pipeline.run_blender(cmd, timeout, label='Conversion')
+        if returncode != 0:
             print(f"❌ Conversion failed for {os.path.basename(fbx_path)}")
             print("--- Blender stderr ---")
-            print(result.stderr)
+            print(stderr)
             print("----------------------")
             return False
         print(f"✅ Converted to {os.path.basename(glb_path)}")
         return True
-    except subprocess.TimeoutExpired:
-        print("❌ Blender process timed out (over 2 minutes).")
+    except pipeline.BlenderTimeout:
+        print(f"❌ Blender process timed out (over {timeout:.0f} seconds).")
+        return False
+    except pipeline.BlenderStalled:
+        print("❌ Blender process stopped producing output and was killed.")
         return False
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
@@ -0,0 +1,569 @@
+"""
+Parallel nearest-neighbour correspondence engine.
+Maps target points (vertices or loops) onto a source point set or surface.
+The source is bucketed once into a uniform grid, placed in shared memory together with the
+queries and result buffers, and queried in spatially coherent chunks from
+a process pool. Workers write results straight into the shared output
+buffers, so nothing is pickled back to the parent.
+
+Pure NumPy: usable inside Blender and from plain Python.
+"""
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_CHUNK_SIZE = 8192       # queries per work item
+SEARCH_BLOCK = 256              # max queries sharing one candidate search box
+PARALLEL_MIN_QUERIES = 50000    # below this, pool start-up costs more than it saves
+BLOCK_ELEMENTS = 1 << 20        # max query x candidate pairs per distance block
+RING_PAIRS = 1 << 17            # max query-candidate pairs per ring-pass batch
+SEARCH_BYTES_PER_QUERY = 1536   # ring-pass temporaries per query in a chunk
+SEARCH_BYTES_PER_PAIR = 32      # distance-block temporaries per query x candidate pair
+INDEX_BYTES_PER_POINT = 64      # peak while building a PointIndex (ids, sort, cell table, sorted copy)
+MORTON_BITS = 10                # bits per axis when ordering queries spatially
+POINTS_PER_CELL = 4             # average source points per grid cell
+BVH_LEAF = 8                    # triangles per leaf of the surface bounding-box tree
+BVH_QUERY_BLOCK = 4096          # queries descending the surface tree together
+
+def default_workers():
+    """Worker count: RIG_WORKERS env var, else all CPUs."""
+    env = os.environ.get('RIG_WORKERS')
+    if env:
+        return max(1, int(env))
+    return os.cpu_count() or 1
+
+# ----------------------------------------------------------------------
+# Geometry kernels
+# ----------------------------------------------------------------------
+def _brute_nearest(queries, candidates, max_pairs=BLOCK_ELEMENTS):
+    """Nearest candidate for each query, in blocks of at most max_pairs distances."""
+    origin = queries.mean(axis=0)
+    q = queries - origin
+    c = candidates - origin
+    c_sq = (c * c).sum(axis=1)
+    best_idx = np.empty(len(q), dtype=np.int64)
+    best_d2 = np.empty(len(q), dtype=np.float64)
+    block = max(1, max_pairs // max(1, len(c)))
+    for start in range(0, len(q), block):
+        qb = q[start:start + block]
+        d2 = (qb * qb).sum(axis=1)[:, None] + c_sq[None, :] - 2.0 * (qb @ c.T)
+        idx = d2.argmin(axis=1)
+        best_idx[start:start + block] = idx
+        best_d2[start:start + block] = np.maximum(d2[np.arange(len(qb)), idx], 0.0)
+    return best_idx, best_d2
+
+def _build_grid(points, chunk=1 << 18):
+    """
+    Bucket points into a uniform grid of roughly POINTS_PER_CELL points per
+    cell. Returns (order sorting points by cell, CSR cell starts, grid params).
+    """
+    n = len(points)
+    lo = points.min(axis=0).astype(np.float64)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-9)
+    target_cells = max(1, n // POINTS_PER_CELL)
+    # Clamp thin axes so flat meshes do not produce microscopic cells
+    clamped = np.maximum(extent, extent.max() * 1e-3)
+    cell = float((np.prod(clamped) / target_cells) ** (1.0 / 3.0))
+    while True:
+        dims = np.maximum(1, np.ceil(extent / cell)).astype(np.int64)
+        if dims.prod() <= 4 * target_cells + 8:
+            break
+        cell *= 1.25
+    cell_id = np.empty(n, dtype=np.int64)
+    for start in range(0, n, chunk):
+        ijk = ((points[start:start + chunk] - lo) / cell).astype(np.int64)
+        np.minimum(ijk, dims - 1, out=ijk)
+        cell_id[start:start + chunk] = (ijk[:, 2] * dims[1] + ijk[:, 1]) * dims[0] + ijk[:, 0]
+    order = np.argsort(cell_id, kind='stable')
+    cell_start = np.zeros(int(dims.prod()) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell_id, minlength=int(dims.prod())), out=cell_start[1:])
+    return order, cell_start, {'origin': lo, 'cell': cell, 'dims': dims}
+
+def _grid_runs(cell_start, grid, lo, hi):
+    """
+    Sorted points in grid cells overlapping the box [lo, hi], as runs:
+    (run starts, run lengths, whether the box covers the whole grid).
+    """
+    dims = grid['dims']
+    c0 = np.clip(np.floor((lo - grid['origin']) / grid['cell']), 0, dims - 1).astype(np.int64)
+    c1 = np.clip(np.floor((hi - grid['origin']) / grid['cell']), 0, dims - 1).astype(np.int64)
+    ys = np.arange(c0[1], c1[1] + 1)
+    zs = np.arange(c0[2], c1[2] + 1)
+    # Cells are x-major, so each (y, z) row of the box is one contiguous run
+    rows = (zs[:, None] * dims[1] + ys[None, :]).ravel() * dims[0]
+    starts = cell_start[rows + c0[0]]
+    lengths = cell_start[rows + c1[0] + 1] - starts
+    covers_all = bool(np.all(c0 == 0) and np.all(c1 == dims - 1))
+    return starts, lengths, covers_all
+
+def _run_slices(starts, lengths, limit):
+    """Yield the point indices of concatenated runs, at most `limit` at a time."""
+    ends = np.cumsum(lengths)
+    total = int(ends[-1]) if len(ends) else 0
+    for first in range(0, total, limit):
+        pos = np.arange(first, min(first + limit, total))
+        run = np.searchsorted(ends, pos, side='right')
+        yield starts[run] + pos - (ends[run] - lengths[run])
+
+def _nearest_ring(points, cell_start, grid, queries, max_pairs=RING_PAIRS):
+    """
+    Vectorized first pass: nearest point among each query's 3x3x3 block of
+    cells. A hit within one cell width is exact, since the block covers that
+    whole ball; other queries come back with d2 = inf.
+    """
+    dims = grid['dims']
+    n = len(queries)
+    ijk = np.clip(np.floor((queries - grid['origin']) / grid['cell']), 0, dims - 1).astype(np.int64)
+    offsets = np.array([(i, j, k) for k in (-1, 0, 1) for j in (-1, 0, 1) for i in (-1, 0, 1)])
+    nb = ijk[:, None, :] + offsets[None, :, :]
+    valid = np.all((nb >= 0) & (nb < dims), axis=2)
+    cell = np.where(valid, (nb[..., 2] * dims[1] + nb[..., 1]) * dims[0] + nb[..., 0], 0)
+    starts = cell_start[cell]
+    lengths = np.where(valid, cell_start[cell + 1] - starts, 0)
+    per_query = lengths.sum(axis=1)
+
+    best_idx = np.zeros(n, dtype=np.int64)
+    best_d2 = np.full(n, np.inf)
+    # Split the queries so no batch gathers more than max_pairs candidates
+    bounds = np.searchsorted(np.cumsum(per_query), np.arange(max_pairs, per_query.sum(), max_pairs))
+    for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, n]):
+        if hi <= lo:
+            continue
+        ln = lengths[lo:hi].ravel()
+        total = int(ln.sum())
+        if total == 0:
+            continue
+        run_offsets = np.cumsum(ln) - ln
+        cand = np.repeat(starts[lo:hi].ravel() - run_offsets, ln) + np.arange(total)
+        owner = np.repeat(np.arange(lo, hi), per_query[lo:hi])
+        diff = points[cand] - queries[owner]
+        d2 = np.einsum('ij,ij->i', diff, diff)
+        # Candidates are grouped by query, so a segmented min finds each best
+        has = per_query[lo:hi] > 0
+        seg_start = (np.cumsum(per_query[lo:hi]) - per_query[lo:hi])[has]
+        seg_min = np.minimum.reduceat(d2, seg_start)
+        best_d2[lo:hi][has] = seg_min
+        winners = np.flatnonzero(d2 == best_d2[owner])
+        best_idx[owner[winners]] = cand[winners]
+    exact = best_d2 <= grid['cell'] ** 2
+    best_d2[~exact] = np.inf
+    return best_idx, best_d2
+
+def _nearest_grid(points, cell_start, grid, queries, radius, max_pairs=BLOCK_ELEMENTS):
+    """
+    Exact nearest neighbour of each query among the grid-sorted `points`.
+    Candidates are drawn from the queries' bounding box grown by `radius`;
+    a result is final once its distance is within the radius, otherwise the
+    radius doubles for the remaining queries. At most max_pairs distances
+    (and max_pairs / 8 gathered candidates) are held at once.
+    """
+    n = len(queries)
+    best_idx = np.zeros(n, dtype=np.int64)
+    best_d2 = np.full(n, np.inf)
+    pending = np.arange(n)
+    while len(pending):
+        qp = queries[pending]
+        starts, lengths, covers_all = _grid_runs(cell_start, grid, qp.min(axis=0) - radius,
+                                                 qp.max(axis=0) + radius)
+        # Far queries can box in much of the grid: gather its candidates in bounded slices
+        for cand in _run_slices(starts, lengths, max(SEARCH_BLOCK, max_pairs // 8)):
+            ci, cd = _brute_nearest(qp, points[cand], max_pairs)
+            better = cd < best_d2[pending]
+            best_idx[pending[better]] = cand[ci[better]]
+            best_d2[pending[better]] = cd[better]
+        if covers_all:
+            break
+        done = best_d2[pending] <= radius * radius
+        pending = pending[~done]
+        radius *= 2.0
+    return best_idx, best_d2
+
+def closest_point_barycentric(p, a, b, c):
+    """
+    Closest point on triangles (a, b, c) to points p, vectorized over any
+    leading shape. Returns (squared distance, barycentric coords [..., 3]).
+    Follows the Voronoi-region tests from Ericson, Real-Time Collision Detection.
+    """
+    ab, ac = b - a, c - a
+    ap, bp, cp = p - a, p - b, p - c
+    d1 = (ab * ap).sum(-1)
+    d2 = (ac * ap).sum(-1)
+    d3 = (ab * bp).sum(-1)
+    d4 = (ac * bp).sum(-1)
+    d5 = (ab * cp).sum(-1)
+    d6 = (ac * cp).sum(-1)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = va + vb + vc
+        v = vb / denom
+        w = vc / denom
+        bary = np.stack([1.0 - v - w, v, w], axis=-1)
+        # Later assignments take precedence, mirroring Ericson's early returns
+        t = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        bc = (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0)
+        bary = np.where(bc[..., None], np.stack([np.zeros_like(t), 1.0 - t, t], -1), bary)
+        t = d2 / (d2 - d6)
+        ac_edge = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+        bary = np.where(ac_edge[..., None], np.stack([1.0 - t, np.zeros_like(t), t], -1), bary)
+        corner_c = (d6 >= 0) & (d5 <= d6)
+        bary = np.where(corner_c[..., None], np.array([0.0, 0.0, 1.0]), bary)
+        t = d1 / (d1 - d3)
+        ab_edge = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+        bary = np.where(ab_edge[..., None], np.stack([1.0 - t, t, np.zeros_like(t)], -1), bary)
+        corner_b = (d3 >= 0) & (d4 <= d3)
+        bary = np.where(corner_b[..., None], np.array([0.0, 1.0, 0.0]), bary)
+        corner_a = (d1 <= 0) & (d2 <= 0)
+        bary = np.where(corner_a[..., None], np.array([1.0, 0.0, 0.0]), bary)
+
+    closest = bary[..., 0:1] * a + bary[..., 1:2] * b + bary[..., 2:3] * c
+    diff = p - closest
+    d2_out = (diff * diff).sum(-1)
+    # Degenerate triangles produce NaNs; never pick them
+    d2_out = np.where(np.isfinite(d2_out), d2_out, np.inf)
+    return d2_out, bary
+
+def _build_bvh(tri_lo, tri_hi):
+    """
+    Bounding-box tree over triangles with boxes [tri_lo, tri_hi]. Leaves hold
+    BVH_LEAF triangles and are padded to a power of two, so the tree is a
+    complete binary heap (children of node i are 2i+1 and 2i+2, leaves start
+    at n_leaves - 1). Each node splits its triangles at the median of its
+    longest centroid axis, one vectorized sort per level.
+    Returns (triangle ids in leaf order, node lo (2L-1, 3), node hi (2L-1, 3)).
+    """
+    centre = (tri_lo + tri_hi) * 0.5
+    m = len(centre)
+    n_leaves = 1 << int(np.ceil(np.log2(max(1, -(-m // BVH_LEAF)))))
+    order = np.arange(m)
+    width = n_leaves * BVH_LEAF
+    while width > BVH_LEAF:
+        # Nodes of this level cover fixed slices of `width` triangles
+        node = np.arange(m) // width
+        sorted_centre = centre[order]
+        starts = np.arange(0, m, width)
+        extent = np.maximum.reduceat(sorted_centre, starts) - np.minimum.reduceat(sorted_centre, starts)
+        key = sorted_centre[np.arange(m), extent.argmax(axis=1)[node]]
+        order = order[np.lexsort((key, node))]
+        width //= 2
+    lo = np.full((2 * n_leaves - 1, 3), np.inf)
+    hi = np.full((2 * n_leaves - 1, 3), -np.inf)
+    starts = np.arange(0, m, BVH_LEAF)
+    lo[n_leaves - 1:n_leaves - 1 + len(starts)] = np.minimum.reduceat(tri_lo[order], starts)
+    hi[n_leaves - 1:n_leaves - 1 + len(starts)] = np.maximum.reduceat(tri_hi[order], starts)
+    # Empty padding leaves keep inverted boxes, which no query reaches
+    first = n_leaves - 1
+    while first:
+        parents = np.arange((first - 1) // 2, first)
+        lo[parents] = np.minimum(lo[2 * parents + 1], lo[2 * parents + 2])
+        hi[parents] = np.maximum(hi[2 * parents + 1], hi[2 * parents + 2])
+        first = parents[0]
+    return order, lo, hi
+
+def _box_distance2(queries, lo, hi):
+    """Squared distance from each query to its box (0 inside, inf for empty boxes)."""
+    gap = np.maximum(lo - queries, 0.0) + np.maximum(queries - hi, 0.0)
+    return np.einsum('ij,ij->i', gap, gap)
+
+def _nearest_triangles(arrs, queries, radius):
+    """
+    Closest triangle to each query. `radius` bounds each query's distance to
+    the surface (its nearest vertex lies on it), so only triangles whose
+    bounding box meets the ball of that radius can hold the closest point;
+    the tree is descended through boxes that meet the ball, and every
+    triangle reached is tested exactly. Returns (triangle index, barycentric coords).
+    """
+    n = len(queries)
+    node_lo, node_hi = arrs['bvh_lo'], arrs['bvh_hi']
+    bvh_tris = arrs['bvh_tris']
+    first_leaf = len(node_lo) // 2
+    # Pad the bound so the nearest vertex's own triangles always qualify
+    bound2 = (radius * (1.0 + 1e-9)) ** 2 + 1e-24
+
+    best_tri = np.zeros(n, dtype=np.int64)
+    best_bary = np.tile([1.0, 0.0, 0.0], (n, 1))
+    best_d2 = np.full(n, np.inf)
+    for qs in range(0, n, BVH_QUERY_BLOCK):
+        owner = np.arange(qs, min(qs + BVH_QUERY_BLOCK, n))
+        node = np.zeros(len(owner), dtype=np.int64)
+        while len(owner) and node[0] < first_leaf:
+            owner = np.repeat(owner, 2)
+            node = 2 * np.repeat(node, 2) + np.tile([1, 2], len(node))
+            keep = _box_distance2(queries[owner], node_lo[node], node_hi[node]) <= bound2[owner]
+            owner, node = owner[keep], node[keep]
+        # Expand the surviving leaves into their triangles
+        slot = (node - first_leaf)[:, None] * BVH_LEAF + np.arange(BVH_LEAF)[None, :]
+        valid = slot < len(bvh_tris)
+        owner = np.broadcast_to(owner[:, None], slot.shape)[valid]
+        tri = bvh_tris[slot[valid]]
+        keep = _box_distance2(queries[owner], arrs['tri_lo'][tri], arrs['tri_hi'][tri]) <= bound2[owner]
+        owner, tri = owner[keep], tri[keep]
+        for s in range(0, len(owner), RING_PAIRS):
+            o, k = owner[s:s + RING_PAIRS], tri[s:s + RING_PAIRS]
+            corners = arrs['points'][arrs['tris'][k]]
+            d2, bary = closest_point_barycentric(queries[o], corners[:, 0], corners[:, 1], corners[:, 2])
+            # Lower each query's best distance, then let one of the pairs that reached it win
+            better = d2 < best_d2[o]
+            np.minimum.at(best_d2, o[better], d2[better])
+            win = np.flatnonzero(better & (d2 == best_d2[o]))
+            best_tri[o[win]] = k[win]
+            best_bary[o[win]] = bary[win]
+    return best_tri, best_bary
+
+def _process_chunk(arrs, params, start, end):
+    """Resolve queries perm[start:end] and write them into the output buffers."""
+    sel = arrs['perm'][start:end]
+    queries = arrs['queries'][sel]
+    if params['ring_first']:
+        nearest, d2 = _nearest_ring(arrs['points'], arrs['cell_start'], params['grid'], queries,
+                                    params['max_pairs'] * RING_PAIRS // BLOCK_ELEMENTS)
+    else:
+        nearest = np.zeros(len(sel), dtype=np.int64)
+        d2 = np.full(len(sel), np.inf)
+    # Unresolved queries go through box search; Z-ordering keeps small blocks tight
+    rest = np.flatnonzero(np.isinf(d2))
+    block = params['search_block']
+    radius = params['radius']
+    for s in range(0, len(rest), block):
+        r = rest[s:s + block]
+        nearest[r], d2[r] = _nearest_grid(arrs['points'], arrs['cell_start'], params['grid'], queries[r], radius,
+                                          params['max_pairs'])
+        # Neighbouring blocks sit at similar distances: start from the last one
+        radius = max(params['radius'], float(np.sqrt(d2[r].max())))
+    arrs['out_index'][sel] = arrs['order'][nearest]
+    arrs['out_d2'][sel] = d2
+    if 'tris' in arrs:
+        tri, bary = _nearest_triangles(arrs, queries, np.sqrt(d2))
+        arrs['out_tri'][sel] = tri
+        arrs['out_bary'][sel] = bary
+
+# ----------------------------------------------------------------------
+# Shared-memory process pool
+# ----------------------------------------------------------------------
+_worker_arrays = None
+_worker_params = None
+_worker_shms = None
+
+def _attach(specs, params):
+    """Pool initializer: map the parent's shared buffers into this worker."""
+    global _worker_arrays, _worker_params, _worker_shms
+    _worker_shms = []
+    _worker_arrays = {}
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shms.append(shm)
+        _worker_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker_params = params
+
+def _run_chunk(bounds):
+    _process_chunk(_worker_arrays, _worker_params, *bounds)
+
+def _morton_order(points):
+    """Permutation that orders points along a Z-order curve."""
+    lo = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lo, 1e-12)
+    cells = ((points - lo) / extent * ((1 << MORTON_BITS) - 1)).astype(np.uint64)
+    code = np.zeros(len(points), dtype=np.uint64)
+    for bit in range(MORTON_BITS):
+        for axis in range(3):
+            code |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+    return np.argsort(code, kind='stable')
+
+def _fork_context():
+    try:
+        return mp.get_context('fork')
+    except ValueError:
+        return None
+
+def _execute(inputs, outputs, params, n_queries, workers, chunk_size, progress=None):
+    """
+    Run _process_chunk over all queries, in-process or on a fork pool.
+    `outputs` maps name -> (shape, dtype); returns a dict of result arrays.
+    `progress(done, total)` is called as chunks finish.
+    """
+    workers = workers or default_workers()
+    ranges = [(s, min(s + chunk_size, n_queries)) for s in range(0, n_queries, chunk_size)]
+    ctx = _fork_context()
+
+    if workers <= 1 or n_queries < PARALLEL_MIN_QUERIES or ctx is None:
+        arrs = dict(inputs)
+        for name, (shape, dtype) in outputs.items():
+            arrs[name] = np.empty(shape, dtype=dtype)
+        for i, (start, end) in enumerate(ranges):
+            _process_chunk(arrs, params, start, end)
+            if progress:
+                progress(i + 1, len(ranges))
+        return {name: arrs[name] for name in outputs}
+
+    shms = []
+    views = {}
+    try:
+        specs = {}
+        for name, arr in inputs.items():
+            arr = np.ascontiguousarray(arr)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+            shms.append(shm)
+            views[name] = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+            views[name][...] = arr
+            specs[name] = (shm.name, arr.shape, arr.dtype.str)
+        for name, (shape, dtype) in outputs.items():
+            dtype = np.dtype(dtype)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            shms.append(shm)
+            views[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            specs[name] = (shm.name, shape, dtype.str)
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=ctx,
+                                 initializer=_attach, initargs=(specs, params)) as pool:
+            for i, _ in enumerate(pool.map(_run_chunk, ranges)):
+                if progress:
+                    progress(i + 1, len(ranges))
+        return {name: views[name].copy() for name in outputs}
+    finally:
+        views.clear()
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+def search_limits(memory_bytes):
+    """
+    (chunk_size, max_pairs) for PointIndex.query whose search temporaries
+    fit in memory_bytes, split evenly between the ring pass and the
+    distance blocks; never larger than the defaults.
+    """
+    half = max(0, int(memory_bytes)) // 2
+    chunk_size = int(np.clip(half // SEARCH_BYTES_PER_QUERY, 256, DEFAULT_CHUNK_SIZE))
+    max_pairs = int(np.clip(half // SEARCH_BYTES_PER_PAIR, 1 << 14, BLOCK_ELEMENTS))
+    return chunk_size, max_pairs
+
+def _search_params(grid, n_points, n_queries, max_pairs=BLOCK_ELEMENTS):
+    """
+    Initial search radius (one grid cell) and queries per search box.
+    When the source is much denser than the queries, boxes hold fewer queries
+    so each box gathers a similar number of candidates, and the per-query
+    ring pass resolves most queries before any box is built. `max_pairs`
+    caps the query x candidate distances computed per block.
+    """
+    block = int(min(SEARCH_BLOCK, max(8, SEARCH_BLOCK * n_queries // max(n_points, 1))))
+    return {'grid': grid, 'radius': grid['cell'], 'search_block': block,
+            'ring_first': block < SEARCH_BLOCK, 'max_pairs': max_pairs}
+
+# ----------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------
+def _as_points(points):
+    """(n, 3) float array; float32 input is kept as float32 to save memory."""
+    points = np.asarray(points)
+    if points.dtype not in (np.float32, np.float64):
+        points = points.astype(np.float64)
+    return points.reshape(-1, 3)
+
+class PointIndex:
+    """
+    Grid index over a fixed source point set, reusable across many queries
+    (e.g. every ICP iteration against the same target).
+    """
+
+    def __init__(self, source_points):
+        source_points = _as_points(source_points)
+        if len(source_points) == 0:
+            raise ValueError("Source point set is empty.")
+        order, self.cell_start, self.grid = _build_grid(source_points)
+        self.points = source_points[order]
+        self.order = order.astype(np.int64)
+
+    def __len__(self):
+        return len(self.order)
+
+    def query(self, query_points, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None,
+              max_pairs=BLOCK_ELEMENTS):
+        """
+        Nearest source point per query: (indices into source_points, squared
+        distances). chunk_size and max_pairs bound the search temporaries
+        (see search_limits()).
+        """
+        query_points = np.asarray(query_points, dtype=np.float64)
+        n = len(query_points)
+        inputs = {
+            'points': self.points,
+            'order': self.order,
+            'cell_start': self.cell_start,
+            'queries': query_points,
+            'perm': _morton_order(query_points) if n else np.zeros(0, np.int64),
+        }
+        outputs = {'out_index': ((n,), np.int64), 'out_d2': ((n,), np.float64)}
+        params = _search_params(self.grid, len(self), n, max_pairs)
+        result = _execute(inputs, outputs, params, n, workers, chunk_size, progress)
+        return result['out_index'], result['out_d2']
+
+def nearest_vertices(source_points, query_points, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     progress=None):
+    """
+    Nearest source point for each query point.
+    Returns (indices into source_points, squared distances).
+    """
+    return PointIndex(source_points).query(query_points, workers, chunk_size, progress)
+
+def nearest_surface(source_points, source_tris, query_points, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                    progress=None):
+    """
+    Closest point on the source triangle surface for each query point. The
+    nearest vertex bounds the search; every triangle whose bounding box
+    meets that ball is tested, so the result is exact.
+    Returns (triangle indices into source_tris, barycentric coords [n, 3]).
+    """
+    source_points = np.asarray(source_points, dtype=np.float64)
+    source_tris = np.asarray(source_tris, dtype=np.int64).reshape(-1, 3)
+    query_points = np.asarray(query_points, dtype=np.float64)
+    if len(source_tris) == 0:
+        raise ValueError("Source surface has no triangles.")
+
+    # Index only vertices that belong to a triangle, sorted by grid cell
+    used = np.flatnonzero(np.bincount(source_tris.ravel(), minlength=len(source_points)) > 0)
+    cell_order, cell_start, grid = _build_grid(source_points[used])
+    order = used[cell_order]
+    remap = np.full(len(source_points), -1, dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    tris = remap[source_tris]
+
+    # Bounding-box tree over the triangles, for the exact closest-point pass
+    corners = source_points[source_tris]
+    tri_lo, tri_hi = corners.min(axis=1), corners.max(axis=1)
+    bvh_tris, bvh_lo, bvh_hi = _build_bvh(tri_lo, tri_hi)
+
+    n = len(query_points)
+    inputs = {
+        'points': source_points[order],
+        'order': order.astype(np.int64),
+        'cell_start': cell_start,
+        'queries': query_points,
+        'perm': _morton_order(query_points) if n else np.zeros(0, np.int64),
+        'tris': tris,
+        'tri_lo': tri_lo,
+        'tri_hi': tri_hi,
+        'bvh_tris': bvh_tris,
+        'bvh_lo': bvh_lo,
+        'bvh_hi': bvh_hi,
+    }
+    outputs = {
+        'out_index': ((n,), np.int64),
+        'out_d2': ((n,), np.float64),
+        'out_tri': ((n,), np.int64),
+        'out_bary': ((n, 3), np.float64),
+    }
+    params = _search_params(grid, len(order), n)
+    result = _execute(inputs, outputs, params, n, workers, chunk_size, progress)
+    return result['out_tri'], result['out_bary']
+
+def interpolate(corner_values, bary):
+    """
+    Blend per-corner values with barycentric weights.
+    corner_values: [n, 3, ...] values at each triangle corner; returns [n, ...].
+    """
+    return np.einsum('nk,nk...->n...', bary, corner_values)
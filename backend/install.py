@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
-Install numpy into Blender's Python environment.
+Install numpy (required) and scipy (optional, for bone-heat skinning)
+into Blender's Python environment.
 Run this script once before using the auto‑rigging backend.
 """
 
@@ -62,6 +63,16 @@ def install_numpy(python_path):
         return False
     return True
 
+def install_scipy(python_path):
+    """Install scipy, needed only for the 'bone_heat' skinning method."""
+    try:
+        subprocess.run([python_path, '-m', 'pip', 'install', 'scipy'], check=True)
+        print("✅ scipy installed successfully.")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"⚠️  Failed to install scipy ({e}); bone-heat skinning will be unavailable.")
+        return False
+
 def verify_numpy(python_path):
     """Check if numpy can be imported."""
     try:
@@ -80,11 +91,11 @@ def main():
         sys.exit(1)
     if verify_numpy(python_path):
         print("✅ numpy already installed.")
-        return
-    if install_numpy(python_path):
+    elif install_numpy(python_path):
         verify_numpy(python_path)
     else:
         sys.exit(1)
+    install_scipy(python_path)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,691 @@
+"""
+Pure-Python/NumPy mesh reading and GLB writing.
+Used as a fast preprocessing path for clean GLB/OBJ/PLY/STL uploads so they
+can be triangulated, flattened and re-exported without launching Blender.
+Anything that needs Blender (skins, morph targets, compressed or external
+buffers, OBJ materials, non-triangle primitives) raises UnsupportedMesh
+and the caller falls back to the Blender preprocessing script.
+"""
+
+import contextlib
+import functools
+import itertools
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+MODE_TRIANGLES = 4
+
+COMPONENT_DTYPES = {
+    5120: np.int8, 5121: np.uint8, 5122: np.int16,
+    5123: np.uint16, 5125: np.uint32, 5126: np.float32,
+}
+TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT4': 16}
+
+# Vertex attributes carried through the fast path, with their component count
+ATTRIBUTES = {'POSITION': 3, 'NORMAL': 3, 'TEXCOORD_0': 2, 'COLOR_0': 4}
+
+class UnsupportedMesh(ValueError):
+    """The input needs Blender to preprocess correctly."""
+
+class Primitive:
+    """Triangle list with per-vertex attributes (keys of ATTRIBUTES)."""
+    __slots__ = ('attributes', 'indices', 'material')
+
+    def __init__(self, attributes, indices, material=None):
+        self.attributes = attributes
+        self.indices = indices
+        self.material = material
+
+class MeshData:
+    """
+    A single mesh ready for export: one primitive per material, plus the
+    glTF material/texture/sampler/image definitions they reference and the
+    raw bytes of any embedded images.
+    """
+    __slots__ = ('primitives', 'materials', 'textures', 'samplers', 'images',
+                 'image_data', 'extensions_used')
+
+    def __init__(self, primitives, materials=None, textures=None, samplers=None,
+                 images=None, image_data=None, extensions_used=None):
+        self.primitives = primitives
+        self.materials = materials or []
+        self.textures = textures or []
+        self.samplers = samplers or []
+        self.images = images or []
+        self.image_data = image_data or []
+        self.extensions_used = extensions_used or []
+
+# ----------------------------------------------------------------------
+# Shared helpers
+# ----------------------------------------------------------------------
+def fan_triangulate(face_sizes):
+    """
+    Corner indices (n_tris, 3) that fan-triangulate consecutive polygons of
+    the given sizes, laid out back to back in one corner array.
+    """
+    face_sizes = np.asarray(face_sizes, dtype=np.int64)
+    if np.any(face_sizes < 3):
+        raise UnsupportedMesh("Polygon with fewer than 3 corners.")
+    starts = np.zeros(len(face_sizes), dtype=np.int64)
+    np.cumsum(face_sizes[:-1], out=starts[1:])
+    n_tris = face_sizes - 2
+    first = np.repeat(starts, n_tris)
+    # Position of each triangle within its fan: 1..k-2
+    offset = np.arange(n_tris.sum()) - np.repeat(np.cumsum(n_tris) - n_tris, n_tris) + 1
+    return np.stack([first, first + offset, first + offset + 1], axis=1)
+
+def merge_primitives(primitives):
+    """Concatenate primitives into one, keeping only attributes they all share."""
+    if len(primitives) == 1:
+        return primitives[0]
+    shared = set.intersection(*(set(p.attributes) for p in primitives))
+    attributes = {name: np.concatenate([p.attributes[name] for p in primitives])
+                  for name in ATTRIBUTES if name in shared}
+    indices = []
+    base = 0
+    for p in primitives:
+        indices.append(p.indices + base)
+        base += len(p.attributes['POSITION'])
+    return Primitive(attributes, np.concatenate(indices), primitives[0].material)
+
+def bake_transform(primitive, matrix):
+    """Apply a node's world matrix to positions and normals in place."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    if np.allclose(matrix, np.eye(4)):
+        return primitive
+    linear = matrix[:3, :3]
+    attrs = primitive.attributes
+    attrs['POSITION'] = (attrs['POSITION'] @ linear.T + matrix[:3, 3]).astype(np.float32)
+    if 'NORMAL' in attrs:
+        normals = attrs['NORMAL'] @ np.linalg.inv(linear)
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        attrs['NORMAL'] = (normals / np.where(length > 0, length, 1.0)).astype(np.float32)
+    if np.linalg.det(linear) < 0:
+        # Mirrored transform: keep faces pointing outwards
+        primitive.indices = primitive.indices[:, ::-1].copy()
+    return primitive
+
+# ----------------------------------------------------------------------
+# OBJ
+# ----------------------------------------------------------------------
+def read_obj(path):
+    """
+    Parse a Wavefront OBJ with v/vt/vn/f records into a MeshData.
+    Polygons are fan-triangulated and corners sharing the same
+    (position, uv, normal) triple become one vertex.
+    """
+    positions, uvs, normals = [], [], []
+    corners, face_sizes = [], []
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            tag = parts[0]
+            if tag == 'v':
+                positions.append(parts[1:])
+            elif tag == 'vt':
+                uvs.append(parts[1:3])
+            elif tag == 'vn':
+                normals.append(parts[1:4])
+            elif tag == 'f':
+                face = parts[1:]
+                face_sizes.append(len(face))
+                for corner in face:
+                    ids = corner.split('/')
+                    corners.append((ids[0],
+                                    ids[1] if len(ids) > 1 and ids[1] else 0,
+                                    ids[2] if len(ids) > 2 and ids[2] else 0))
+            elif tag in ('o', 'g', 's'):
+                continue
+            else:
+                # mtllib/usemtl, lines, curves, ... need Blender's importer
+                raise UnsupportedMesh(f"OBJ statement '{tag}' requires Blender preprocessing.")
+
+    if not positions or not face_sizes:
+        raise UnsupportedMesh("OBJ has no faces.")
+    widths = {len(p) for p in positions}
+    if len(widths) != 1 or widths.pop() not in (3, 4, 6):
+        raise UnsupportedMesh("OBJ vertex records have inconsistent widths.")
+    v = np.array(positions, dtype=np.float64)
+
+    refs = np.array(corners, dtype=np.int64)
+    counts = np.array([len(v), len(uvs), len(normals)])
+    for col in range(3):
+        # Negative indices count back from the end; 1-based otherwise
+        neg = refs[:, col] < 0
+        refs[neg, col] += counts[col] + 1
+    refs -= 1  # missing uv/normal (0) becomes -1
+    has_uv = bool(uvs) and np.all(refs[:, 1] >= 0)
+    has_normal = bool(normals) and np.all(refs[:, 2] >= 0)
+    if np.any(refs[:, 0] < 0) or np.any(refs[:, 0] >= len(v)):
+        raise UnsupportedMesh("OBJ face references a missing vertex.")
+
+    key = refs[:, [0] + ([1] if has_uv else []) + ([2] if has_normal else [])]
+    unique, inverse = np.unique(key, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    attributes = {'POSITION': v[unique[:, 0], :3].astype(np.float32)}
+    col = 1
+    if has_uv:
+        uv = np.array(uvs, dtype=np.float64)[unique[:, col]]
+        # OBJ puts v=0 at the bottom, glTF at the top
+        attributes['TEXCOORD_0'] = np.stack([uv[:, 0], 1.0 - uv[:, 1]], axis=1).astype(np.float32)
+        col += 1
+    if has_normal:
+        attributes['NORMAL'] = np.array(normals, dtype=np.float32)[unique[:, col]]
+    if v.shape[1] >= 6:
+        rgb = v[unique[:, 0], -3:]
+        attributes['COLOR_0'] = np.concatenate([rgb, np.ones((len(rgb), 1))], axis=1).astype(np.float32)
+
+    indices = inverse[fan_triangulate(face_sizes)].astype(np.uint32)
+    return MeshData([Primitive(attributes, indices)])
+
+# ----------------------------------------------------------------------
+# GLB
+# ----------------------------------------------------------------------
+def _parse_glb(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 20:
+        raise UnsupportedMesh("File too small to be a GLB.")
+    magic, version, length = struct.unpack_from('<III', data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise UnsupportedMesh("Not a glTF 2.0 binary file.")
+    gltf, binary = None, b''
+    offset = 12
+    while offset + 8 <= min(length, len(data)):
+        chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+        chunk = data[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk.decode('utf-8'))
+        elif chunk_type == CHUNK_BIN:
+            binary = chunk
+        offset += 8 + chunk_length
+    if gltf is None:
+        raise UnsupportedMesh("GLB has no JSON chunk.")
+    return gltf, binary
+
+def _buffer_view_bytes(gltf, binary, index):
+    view = gltf['bufferViews'][index]
+    buffer = gltf['buffers'][view['buffer']]
+    if view['buffer'] != 0 or 'uri' in buffer:
+        raise UnsupportedMesh("External buffers require Blender preprocessing.")
+    start = view.get('byteOffset', 0)
+    return binary[start:start + view['byteLength']], view.get('byteStride')
+
+def _read_accessor(gltf, binary, index):
+    """Read an accessor into an (count, components) or (count,) array."""
+    acc = gltf['accessors'][index]
+    if 'sparse' in acc:
+        raise UnsupportedMesh("Sparse accessors require Blender preprocessing.")
+    dtype = np.dtype(COMPONENT_DTYPES[acc['componentType']]).newbyteorder('<')
+    width = TYPE_SIZES[acc['type']]
+    count = acc['count']
+    if 'bufferView' not in acc:
+        out = np.zeros((count, width), dtype=dtype)
+    else:
+        raw, stride = _buffer_view_bytes(gltf, binary, acc['bufferView'])
+        element = dtype.itemsize * width
+        stride = stride or element
+        out = np.ndarray((count, width), dtype=dtype, buffer=raw,
+                         offset=acc.get('byteOffset', 0), strides=(stride, dtype.itemsize)).copy()
+    if acc.get('normalized') and dtype.kind in 'iu':
+        out = out.astype(np.float32) / np.iinfo(dtype).max
+        if dtype.kind == 'i':
+            out = np.maximum(out, -1.0)
+    return out if width > 1 else out.ravel()
+
+def _node_matrix(node):
+    if 'matrix' in node:
+        return np.array(node['matrix'], dtype=np.float64).reshape(4, 4).T
+    m = np.eye(4)
+    x, y, z, w = node.get('rotation', [0.0, 0.0, 0.0, 1.0])
+    m[:3, :3] = [
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ]
+    m[:3, :3] *= np.array(node.get('scale', [1.0, 1.0, 1.0]))[None, :]
+    m[:3, 3] = node.get('translation', [0.0, 0.0, 0.0])
+    return m
+
+def _mesh_instances(gltf):
+    """Yield (mesh index, world matrix) for every mesh node in the default scene."""
+    nodes = gltf.get('nodes', [])
+    scenes = gltf.get('scenes', [])
+    if scenes:
+        roots = scenes[gltf.get('scene', 0)].get('nodes', [])
+    else:
+        children = {c for n in nodes for c in n.get('children', [])}
+        roots = [i for i in range(len(nodes)) if i not in children]
+    stack = [(i, np.eye(4)) for i in roots]
+    while stack:
+        i, parent = stack.pop()
+        node = nodes[i]
+        world = parent @ _node_matrix(node)
+        if 'mesh' in node:
+            yield node['mesh'], world
+        stack.extend((c, world) for c in node.get('children', []))
+
+def read_glb(path):
+    """
+    Read a GLB, bake every mesh node's world transform and merge all
+    primitives that share a material into one.
+    """
+    gltf, binary = _parse_glb(path)
+    if gltf.get('extensionsRequired'):
+        raise UnsupportedMesh(f"Required extensions {gltf['extensionsRequired']} need Blender.")
+    if gltf.get('skins'):
+        raise UnsupportedMesh("Skinned meshes require Blender preprocessing.")
+    if any('uri' in img for img in gltf.get('images', [])):
+        raise UnsupportedMesh("External images require Blender preprocessing.")
+
+    by_material = {}
+    for mesh_index, world in _mesh_instances(gltf):
+        for prim in gltf['meshes'][mesh_index]['primitives']:
+            if prim.get('mode', MODE_TRIANGLES) != MODE_TRIANGLES:
+                raise UnsupportedMesh("Non-triangle primitives require Blender preprocessing.")
+            if prim.get('targets'):
+                raise UnsupportedMesh("Morph targets require Blender preprocessing.")
+            if 'POSITION' not in prim['attributes']:
+                continue
+            attributes = {}
+            for name, width in ATTRIBUTES.items():
+                if name in prim['attributes']:
+                    values = _read_accessor(gltf, binary, prim['attributes'][name]).astype(np.float32)
+                    if name == 'COLOR_0' and values.shape[1] == 3:
+                        values = np.concatenate([values, np.ones((len(values), 1), np.float32)], axis=1)
+                    attributes[name] = values
+            n = len(attributes['POSITION'])
+            if 'indices' in prim:
+                indices = _read_accessor(gltf, binary, prim['indices']).astype(np.uint32)
+            else:
+                indices = np.arange(n, dtype=np.uint32)
+            primitive = Primitive(attributes, indices.reshape(-1, 3), prim.get('material'))
+            by_material.setdefault(prim.get('material'), []).append(bake_transform(primitive, world))
+
+    if not by_material:
+        raise UnsupportedMesh("GLB contains no mesh geometry.")
+
+    image_data = []
+    for img in gltf.get('images', []):
+        raw, _ = _buffer_view_bytes(gltf, binary, img['bufferView'])
+        image_data.append(bytes(raw))
+    return MeshData(
+        [merge_primitives(prims) for prims in by_material.values()],
+        materials=gltf.get('materials', []),
+        textures=gltf.get('textures', []),
+        samplers=gltf.get('samplers', []),
+        images=[{k: v for k, v in img.items() if k != 'bufferView'} for img in gltf.get('images', [])],
+        image_data=image_data,
+        extensions_used=gltf.get('extensionsUsed', []),
+    )
+
+def write_glb(mesh, path, name='Mesh'):
+    """Write a MeshData as a single-node, single-mesh GLB."""
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'Bio-React fast preprocessor'},
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0, 'name': name}],
+        'meshes': [{'name': name, 'primitives': []}],
+        'accessors': [],
+        'bufferViews': [],
+        'buffers': [],
+    }
+    blob = bytearray()
+
+    def add_view(data, target=None):
+        while len(blob) % 4:
+            blob.append(0)
+        view = {'buffer': 0, 'byteOffset': len(blob), 'byteLength': len(data)}
+        if target:
+            view['target'] = target
+        blob.extend(data)
+        gltf['bufferViews'].append(view)
+        return len(gltf['bufferViews']) - 1
+
+    def add_accessor(array, component_type, type_name, target, with_bounds=False):
+        accessor = {
+            'bufferView': add_view(np.ascontiguousarray(array).tobytes(), target),
+            'componentType': component_type,
+            'count': len(array),
+            'type': type_name,
+        }
+        if with_bounds:
+            accessor['min'] = array.min(axis=0).tolist()
+            accessor['max'] = array.max(axis=0).tolist()
+        gltf['accessors'].append(accessor)
+        return len(gltf['accessors']) - 1
+
+    for prim in mesh.primitives:
+        attrs = {}
+        for name, width in ATTRIBUTES.items():
+            if name in prim.attributes:
+                values = prim.attributes[name].astype('<f4')
+                attrs[name] = add_accessor(values, 5126, f'VEC{width}', 34962, with_bounds=(name == 'POSITION'))
+        indices = prim.indices.astype('<u4').ravel()
+        out = {'attributes': attrs, 'indices': add_accessor(indices, 5125, 'SCALAR', 34963), 'mode': MODE_TRIANGLES}
+        if prim.material is not None:
+            out['material'] = prim.material
+        gltf['meshes'][0]['primitives'].append(out)
+
+    if mesh.materials:
+        gltf['materials'] = mesh.materials
+    if mesh.textures:
+        gltf['textures'] = mesh.textures
+    if mesh.samplers:
+        gltf['samplers'] = mesh.samplers
+    if mesh.images:
+        gltf['images'] = [dict(img, bufferView=add_view(data)) for img, data in zip(mesh.images, mesh.image_data)]
+    if mesh.extensions_used:
+        gltf['extensionsUsed'] = mesh.extensions_used
+
+    while len(blob) % 4:
+        blob.append(0)
+    gltf['buffers'].append({'byteLength': len(blob)})
+    json_bytes = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    json_bytes += b' ' * (-len(json_bytes) % 4)
+
+    total = 12 + 8 + len(json_bytes) + 8 + len(blob)
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<III', GLB_MAGIC, 2, total))
+        f.write(struct.pack('<II', len(json_bytes), CHUNK_JSON))
+        f.write(json_bytes)
+        f.write(struct.pack('<II', len(blob), CHUNK_BIN))
+        f.write(blob)
+    return path
+
+# ----------------------------------------------------------------------
+# Memory-mapped scan formats (PLY, STL)
+# ----------------------------------------------------------------------
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+PLY_FACE_LISTS = ('vertex_indices', 'vertex_index')
+PLY_UV_NAMES = (('u', 'v'), ('s', 't'), ('texture_u', 'texture_v'))
+FACE_RUN_WINDOW = 1 << 16   # records checked per step when splitting polygon runs
+FACE_RUN_MIN = 16           # smallest window after a polygon size change
+STL_RECORD = np.dtype([('normal', '<f4', (3,)), ('corners', '<f4', (3, 3)), ('attribute', '<u2')])
+
+@contextlib.contextmanager
+def _mapped(path):
+    """Read-only memory map of a file; arrays taken from it must be copied before exit."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise UnsupportedMesh("File is empty.")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+def _polygon_runs(count_at, parse_run, n_faces):
+    """
+    Split a stream of variable-length polygon records into runs of equal
+    size k, so each run is parsed as one fixed-size array. `count_at(pos)`
+    reads a record's corner count; `parse_run(pos, k, limit)` returns
+    (corner counts, corners (m, k), next pos) for up to `limit` records.
+    Returns (face sizes, flat corner array, end pos).
+    """
+    sizes, corners = [], []
+    pos, remaining, window = 0, n_faces, FACE_RUN_WINDOW
+    while remaining:
+        k = count_at(pos)
+        if k < 3:
+            raise UnsupportedMesh("PLY polygon with fewer than 3 corners.")
+        counts, run, next_pos = parse_run(pos, k, min(remaining, window))
+        # Records after the first size change are misaligned; keep only the run
+        m = int(np.argmax(counts != k)) if np.any(counts != k) else len(counts)
+        sizes.append(np.full(m, k, dtype=np.int64))
+        corners.append(np.array(run[:m], dtype=np.int64).ravel())
+        pos = next_pos(m)
+        remaining -= m
+        # Grow geometrically while runs fill the window; after a break, size it from the
+        # run just read so mixed polygon sizes stay linear in the face count
+        window = window * 2 if m == len(counts) else max(FACE_RUN_MIN, 2 * m)
+    if not sizes:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), pos
+    return np.concatenate(sizes), np.concatenate(corners), pos
+
+def _parse_ply_header(mm):
+    end = mm.find(b'end_header')
+    if mm[:3] != b'ply' or end < 0:
+        raise UnsupportedMesh("Not a PLY file.")
+    body = mm.find(b'\n', end) + 1
+    fmt, elements = None, []
+    for line in mm[:end].decode('ascii', errors='replace').splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == 'format':
+            fmt = parts[1]
+        elif parts[0] == 'element':
+            elements.append({'name': parts[1], 'count': int(parts[2]), 'props': []})
+        elif parts[0] == 'property':
+            if not elements:
+                raise UnsupportedMesh("PLY property outside an element.")
+            try:
+                if parts[1] == 'list':
+                    prop = (parts[4], PLY_TYPES[parts[2]], PLY_TYPES[parts[3]])
+                else:
+                    prop = (parts[2], PLY_TYPES[parts[1]], None)
+            except (KeyError, IndexError):
+                raise UnsupportedMesh(f"Unsupported PLY property: {line.strip()}")
+            elements[-1]['props'].append(prop)
+    if fmt not in ('ascii', 'binary_little_endian', 'binary_big_endian'):
+        raise UnsupportedMesh(f"Unsupported PLY format {fmt!r}.")
+    return fmt, elements, body
+
+def _ply_face_layout(element):
+    """(count type, index type, scalar props before the list, scalar props after it)."""
+    lists = [i for i, (_, _, item) in enumerate(element['props']) if item is not None]
+    if len(lists) != 1 or element['props'][lists[0]][0] not in PLY_FACE_LISTS:
+        raise UnsupportedMesh("PLY faces need exactly one vertex index list (texcoord lists need Blender).")
+    i = lists[0]
+    _, count_type, index_type = element['props'][i]
+    return count_type, index_type, element['props'][:i], element['props'][i + 1:]
+
+def _read_ply_binary(mm, fmt, elements, offset):
+    order = '<' if fmt == 'binary_little_endian' else '>'
+    vertices, faces = None, None
+    for element in elements:
+        if element['name'] == 'face':
+            count_type, index_type, before, after = _ply_face_layout(element)
+            count_type, index_type = order + count_type, order + index_type
+
+            @functools.lru_cache(maxsize=None)
+            def record(k):
+                return np.dtype([(name, order + t) for name, t, _ in before] + [('n', count_type)] +
+                                [('corners', index_type, (k,))] +
+                                [(name, order + t) for name, t, _ in after])
+            head = record(1).fields['n'][1]
+
+            def count_at(pos, base=offset):
+                return int(np.frombuffer(mm, count_type, 1, base + pos + head)[0])
+
+            def parse_run(pos, k, limit, base=offset):
+                dtype = record(k)
+                limit = min(limit, (len(mm) - base - pos) // dtype.itemsize)
+                if limit <= 0:
+                    raise UnsupportedMesh("PLY face data is truncated.")
+                recs = np.frombuffer(mm, dtype, limit, base + pos)
+                return recs['n'], recs['corners'], lambda m: pos + m * dtype.itemsize
+
+            sizes, corners, length = _polygon_runs(count_at, parse_run, element['count'])
+            faces = (sizes, corners)
+            offset += length
+        else:
+            if any(item is not None for _, _, item in element['props']):
+                raise UnsupportedMesh(f"PLY element '{element['name']}' has list properties.")
+            dtype = np.dtype([(name, order + t) for name, t, _ in element['props']])
+            if offset + dtype.itemsize * element['count'] > len(mm):
+                raise UnsupportedMesh(f"PLY {element['name']} data is truncated.")
+            if element['name'] == 'vertex':
+                vertices = np.frombuffer(mm, dtype, element['count'], offset).copy()
+            offset += dtype.itemsize * element['count']
+    return vertices, faces
+
+def _read_ply_ascii(mm, elements, offset):
+    # ASCII PLY has one record per line, so faces are split by line rather than by run
+    lines = list(filter(None, map(bytes.strip, mm[offset:].splitlines())))
+    vertices, faces = None, None
+    pos = 0
+    for element in elements:
+        records = lines[pos:pos + element['count']]
+        if len(records) < element['count']:
+            raise UnsupportedMesh(f"PLY {element['name']} data is truncated.")
+        pos += element['count']
+        if element['name'] == 'face':
+            _, _, before, after = _ply_face_layout(element)
+            lead, tail = len(before), len(after)
+            split = [r.split() for r in records]
+            widths = np.fromiter(map(len, split), np.int64, len(split))
+            tokens = np.array(list(itertools.chain.from_iterable(split))).astype(np.float64)
+            starts = np.cumsum(widths) - widths
+            if np.any(widths < lead + 1):
+                raise UnsupportedMesh("PLY face record is truncated.")
+            sizes = tokens[starts + lead].astype(np.int64)
+            if np.any(sizes < 3):
+                raise UnsupportedMesh("PLY polygon with fewer than 3 corners.")
+            if np.any(widths != lead + 1 + sizes + tail):
+                raise UnsupportedMesh("PLY face record does not match its corner count.")
+            # Corner j of face i sits at starts[i] + lead + 1 + j
+            first = np.cumsum(sizes) - sizes
+            within = np.arange(int(sizes.sum())) - np.repeat(first, sizes)
+            corners = tokens[np.repeat(starts + lead + 1, sizes) + within].astype(np.int64)
+            faces = (sizes, corners)
+        elif any(item is not None for _, _, item in element['props']):
+            raise UnsupportedMesh(f"PLY element '{element['name']}' has list properties.")
+        elif element['name'] == 'vertex':
+            values = np.array(b' '.join(records).split()).astype(np.float64)
+            if len(values) != len(element['props']) * element['count']:
+                raise UnsupportedMesh("PLY vertex records do not match the header.")
+            values = values.reshape(element['count'], -1)
+            dtype = [(name, 'f8') for name, _, _ in element['props']]
+            vertices = np.empty(element['count'], dtype=dtype)
+            for i, (name, _, _) in enumerate(element['props']):
+                vertices[name] = values[:, i]
+    return vertices, faces
+
+def _ply_color(vertices, names, ply_types):
+    channels = [vertices[name].astype(np.float32) for name in names]
+    # Integer channels are 0..255 (or 0..65535); float channels are already 0..1
+    if ply_types[names[0]] in ('u1', 'i1'):
+        channels = [c / 255.0 for c in channels]
+    elif ply_types[names[0]] in ('u2', 'i2'):
+        channels = [c / 65535.0 for c in channels]
+    if len(channels) == 3:
+        channels.append(np.ones(len(vertices), dtype=np.float32))
+    return np.stack(channels, axis=1).astype(np.float32)
+
+def read_ply(path):
+    """
+    Parse an ascii or binary PLY (vertex + face elements) into a MeshData.
+    Vertex normals, colours (red/green/blue[/alpha]) and u/v coordinates
+    are kept; polygons are fan-triangulated.
+    """
+    with _mapped(path) as mm:
+        fmt, elements, offset = _parse_ply_header(mm)
+        if fmt == 'ascii':
+            vertices, faces = _read_ply_ascii(mm, elements, offset)
+        else:
+            vertices, faces = _read_ply_binary(mm, fmt, elements, offset)
+    if vertices is None or faces is None or len(faces[0]) == 0:
+        raise UnsupportedMesh("PLY has no faces (point clouds need Blender).")
+    names = vertices.dtype.names
+    if not {'x', 'y', 'z'} <= set(names):
+        raise UnsupportedMesh("PLY vertices have no x/y/z.")
+    ply_types = {name: t for element in elements if element['name'] == 'vertex'
+                 for name, t, _ in element['props']}
+
+    def column_stack(*fields):
+        return np.stack([vertices[f] for f in fields], axis=1).astype(np.float32)
+
+    attributes = {'POSITION': column_stack('x', 'y', 'z')}
+    if {'nx', 'ny', 'nz'} <= set(names):
+        attributes['NORMAL'] = column_stack('nx', 'ny', 'nz')
+    for u, v in PLY_UV_NAMES:
+        if u in names and v in names:
+            # PLY follows OBJ's bottom-left UV origin
+            attributes['TEXCOORD_0'] = np.stack([vertices[u], 1.0 - vertices[v]], axis=1).astype(np.float32)
+            break
+    if {'red', 'green', 'blue'} <= set(names):
+        rgba = ('red', 'green', 'blue') + (('alpha',) if 'alpha' in names else ())
+        attributes['COLOR_0'] = _ply_color(vertices, rgba, ply_types)
+
+    sizes, corners = faces
+    if np.any(corners < 0) or np.any(corners >= len(vertices)):
+        raise UnsupportedMesh("PLY face references a missing vertex.")
+    indices = corners[fan_triangulate(sizes)].astype(np.uint32)
+    return MeshData([Primitive(attributes, indices)])
+
+def _weld(points):
+    """
+    Merge bit-identical (n, 3) float32 points: returns (unique points, inverse).
+    Rows are sorted by a 64-bit hash of their bits, which is much faster than
+    np.unique(axis=0); a hash collision is detected and handled by that
+    slower exact path.
+    """
+    points = points + np.float32(0.0)  # -0.0 and 0.0 weld together
+    bits = points.view(np.uint32).astype(np.uint64)
+    key = (bits[:, 0] << np.uint64(32)) | bits[:, 1]
+    key ^= bits[:, 2] * np.uint64(0x9E3779B97F4A7C15)
+    order = np.argsort(key)
+    sorted_key = key[order]
+    new = np.empty(len(order), dtype=bool)
+    new[:1] = True
+    np.not_equal(sorted_key[1:], sorted_key[:-1], out=new[1:])
+    inverse = np.empty(len(order), dtype=np.int64)
+    inverse[order] = np.cumsum(new) - 1
+    unique = points[order[new]]
+    if not np.array_equal(unique[inverse], points):
+        unique, inverse = np.unique(points, axis=0, return_inverse=True)
+    return unique, inverse.ravel()
+
+def read_stl(path):
+    """
+    Parse a binary or ascii STL into a MeshData. Facet corners are welded
+    into shared vertices with np.unique so the mesh is connected.
+    """
+    with _mapped(path) as mm:
+        n = struct.unpack_from('<I', mm, 80)[0] if len(mm) >= 84 else -1
+        if n >= 0 and len(mm) == 84 + n * STL_RECORD.itemsize:
+            corners = np.frombuffer(mm, STL_RECORD, n, 84)['corners'].reshape(-1, 3).copy()
+        elif mm[:5].lower() == b'solid':
+            tokens = np.array(mm[:].split())
+            at = np.flatnonzero(tokens == b'vertex')
+            if len(at) != 3 * np.count_nonzero(tokens == b'facet'):
+                raise UnsupportedMesh("ASCII STL facets must be triangles.")
+            corners = tokens[at[:, None] + np.arange(1, 4)].astype(np.float32)
+        else:
+            raise UnsupportedMesh("Not an STL file.")
+    if len(corners) == 0:
+        raise UnsupportedMesh("STL has no facets.")
+    positions, inverse = _weld(corners)
+    indices = inverse.reshape(-1, 3).astype(np.uint32)
+    return MeshData([Primitive({'POSITION': positions.astype(np.float32)}, indices)])
+
+def read_mesh(path):
+    """Read any fast-path format; raises UnsupportedMesh otherwise."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.obj':
+        return read_obj(path)
+    if ext == '.glb':
+        return read_glb(path)
+    if ext == '.ply':
+        return read_ply(path)
+    if ext == '.stl':
+        return read_stl(path)
+    raise UnsupportedMesh(f"No fast path for {ext} files.")
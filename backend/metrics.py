@@ -0,0 +1,33 @@
+"""
+Lightweight in-process metrics for the rigging backend.
+Counters are bumped by the server and pipeline; gauges are callables
+sampled whenever a snapshot is taken (e.g. by the /metrics endpoint).
+"""
+
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+
+def incr(name, amount=1):
+    """Increment a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def register_gauge(name, fn):
+    """Register a zero-argument callable whose value is sampled on snapshot."""
+    with _lock:
+        _gauges[name] = fn
+
+def snapshot():
+    """Return a dict of all counters and current gauge values."""
+    with _lock:
+        data = dict(_counters)
+        gauges = list(_gauges.items())
+    for name, fn in gauges:
+        try:
+            data[name] = fn()
+        except Exception:
+            data[name] = None
+    return data
@@ -6,13 +6,23 @@ Serves as the communication layer between the Flask server and Blender rigger.
 """
 
 import os
+import signal
+import struct
 import subprocess
 import tempfile
 import shutil
 import json
 import logging
+import threading
+import time
+from collections import deque
 from pathlib import Path
 
+import metrics
+import mesh_io
+import rig_math
+from artifacts import ArtifactStore, artifact_key, hash_file
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -23,13 +33,205 @@ BASE_DIR = os.path.dirname(__file__)
 RIGGER_SCRIPT = os.path.join(BASE_DIR, 'rigger.py')
 TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates', 'human.glb')  # default template
 
+SKINNING_METHODS = ('template', 'bone_heat')
+
+# Default rigging options; any of these can be overridden per run
+RIG_OPTIONS = {
+    'smooth_iterations': 10,
+    'smooth_factor': 0.5,
+    'skinning': 'template',   # one of SKINNING_METHODS
+    # Execution mode only: not part of any artifact key
+    'icp_low_memory': 'auto',
+    'memory_budget_mb': rig_math.DEFAULT_MEMORY_BUDGET_MB,
+}
+# Options that change how a job runs but never its result
+EXECUTION_OPTIONS = ('icp_low_memory', 'memory_budget_mb')
+
+# Bump a stage version whenever its algorithm changes to invalidate cached artifacts
+STAGE_VERSIONS = {
+    'prepared': 1,
+    'alignment': 2,
+    'raw_weights': 2,
+    'smoothed_weights': 1,
+}
+
+# Blender timeouts scale with estimated vertex count: base + per_vertex * n,
+# clamped to [minimum, maximum] seconds
+TIMEOUTS = {
+    'prepare': {'base': 30, 'per_vertex': 5e-5, 'minimum': 30, 'maximum': 900},
+    'rig': {'base': 60, 'per_vertex': 3e-4, 'minimum': 60, 'maximum': 3600},
+    'convert': {'base': 30, 'per_vertex': 5e-5, 'minimum': 30, 'maximum': 900},
+}
+STALL_FRACTION = 0.5     # a job is stalled after this fraction of its timeout without output
+STALL_MINIMUM = 60       # ... but never sooner than this many seconds
+BYTES_PER_VERTEX = {'.obj': 60, '.fbx': 50, '.gltf': 40, '.glb': 40, '.ply': 40, '.stl': 100}
+OUTPUT_TAIL_LINES = 200  # lines of Blender output kept for error messages
+
+class BlenderError(RuntimeError):
+    """A Blender subprocess failed, timed out, stalled or was cancelled."""
+
+class BlenderTimeout(BlenderError):
+    pass
+
+class BlenderStalled(BlenderError):
+    pass
+
+class JobCancelled(BlenderError):
+    pass
+
+def resolve_options(options: dict = None) -> dict:
+    """Per-run overrides merged over RIG_OPTIONS and validated."""
+    options = {**RIG_OPTIONS, **(options or {})}
+    if options['skinning'] not in SKINNING_METHODS:
+        raise ValueError(f"Unknown skinning method {options['skinning']!r}; expected one of {SKINNING_METHODS}")
+    if not options['memory_budget_mb'] > 0:
+        raise ValueError(f"memory_budget_mb must be positive, got {options['memory_budget_mb']!r}")
+    return options
+
+def result_key(options: dict = None) -> dict:
+    """
+    Everything besides the input and template that determines a job's
+    output: the resolved result-affecting options and the stage versions.
+    Output caches keyed on it go stale whenever a default or a stage changes.
+    """
+    resolved = resolve_options(options)
+    return {
+        'options': {k: v for k, v in resolved.items() if k not in EXECUTION_OPTIONS},
+        'stages': dict(STAGE_VERSIONS),
+    }
+
+def check_cancelled(cancel_event: threading.Event, stage: str):
+    """Raise JobCancelled between stages once the job's cancel_event is set."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled(f"Cancelled before {stage}")
+
+# ----------------------------------------------------------------------
+# Blender subprocess management
+# ----------------------------------------------------------------------
+def estimate_vertex_count(path: str) -> int:
+    """
+    Cheap estimate of a mesh file's vertex count.
+    GLB files are exact (sum of POSITION accessor counts from the JSON
+    header); other formats are estimated from the file size.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.glb':
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(20)
+                _, _, _, json_length, _ = struct.unpack('<IIIII', header)
+                gltf = json.loads(f.read(json_length))
+            accessors = gltf.get('accessors', [])
+            return sum(accessors[prim['attributes']['POSITION']]['count']
+                       for mesh in gltf.get('meshes', [])
+                       for prim in mesh.get('primitives', [])
+                       if 'POSITION' in prim.get('attributes', {}))
+        except Exception:
+            logger.debug(f"Could not read GLB header of {path}", exc_info=True)
+    return os.path.getsize(path) // BYTES_PER_VERTEX.get(ext, 40)
+
+def estimate_timeout(path: str, kind: str) -> float:
+    """Timeout in seconds for a Blender job of the given kind on this file."""
+    cfg = TIMEOUTS[kind]
+    seconds = cfg['base'] + cfg['per_vertex'] * estimate_vertex_count(path)
+    return float(min(max(seconds, cfg['minimum']), cfg['maximum']))
+
+def _kill_process_tree(proc):
+    """Kill Blender and any children it spawned (e.g. worker pools)."""
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+def run_blender(cmd: list, timeout: float, cancel_event: threading.Event = None, label: str = 'blender',
+                detect_stalls: bool = True, workers: int = None):
+    """
+    Run a Blender command with a watchdog.
+    The process tree is killed when the timeout expires, when no output has
+    been seen for the stall window, or when cancel_event is set.
+    Pass detect_stalls=False for scripts whose long steps are single silent
+    operator calls; the overall timeout still applies. `workers` caps the
+    correspondence process pool inside Blender (RIG_WORKERS).
+    Returns (returncode, stdout, stderr); stdout/stderr hold the output tail.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled(f"{label} cancelled before start")
+    stall_timeout = max(STALL_MINIMUM, timeout * STALL_FRACTION)
+    env = {**os.environ, 'RIG_WORKERS': str(workers)} if workers else None
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, start_new_session=True, env=env)
+    streams = {'stdout': deque(maxlen=OUTPUT_TAIL_LINES), 'stderr': deque(maxlen=OUTPUT_TAIL_LINES)}
+    last_output = [time.monotonic()]
+
+    def pump(stream, lines):
+        for line in stream:
+            lines.append(line)
+            last_output[0] = time.monotonic()
+
+    readers = [threading.Thread(target=pump, args=(proc.stdout, streams['stdout']), daemon=True),
+               threading.Thread(target=pump, args=(proc.stderr, streams['stderr']), daemon=True)]
+    for reader in readers:
+        reader.start()
+
+    started = time.monotonic()
+    try:
+        while proc.poll() is None:
+            now = time.monotonic()
+            if cancel_event is not None and cancel_event.is_set():
+                _kill_process_tree(proc)
+                metrics.incr('blender_cancelled')
+                raise JobCancelled(f"{label} cancelled")
+            if now - started > timeout:
+                _kill_process_tree(proc)
+                metrics.incr('blender_timeouts')
+                raise BlenderTimeout(f"{label} timed out after {timeout:.0f}s")
+            if detect_stalls and now - last_output[0] > stall_timeout:
+                _kill_process_tree(proc)
+                metrics.incr('blender_stalls')
+                raise BlenderStalled(f"{label} produced no output for {stall_timeout:.0f}s")
+            time.sleep(0.25)
+    finally:
+        if proc.poll() is None:
+            _kill_process_tree(proc)
+        for reader in readers:
+            reader.join(timeout=5)
+
+    metrics.incr('blender_runs')
+    metrics.incr('blender_seconds', round(time.monotonic() - started, 3))
+    return proc.returncode, ''.join(streams['stdout']), ''.join(streams['stderr'])
+
 # ----------------------------------------------------------------------
 # Pre‑processing: convert any input to a clean GLB
 # ----------------------------------------------------------------------
-def prepare_for_rigging(input_path: str, output_dir: str) -> str:
+def prepare_fast(input_path: str, output_path: str) -> bool:
+    """
+    Preprocess without Blender when the input is a clean GLB/OBJ/PLY/STL:
+    parse it, fan-triangulate, bake node transforms, merge primitives per
+    material and write a GLB. Returns False if Blender is needed instead.
+    """
+    try:
+        mesh = mesh_io.read_mesh(input_path)
+        mesh_io.write_glb(mesh, output_path)
+    except mesh_io.UnsupportedMesh as e:
+        logger.info(f"Fast preprocessing not applicable ({e}); using Blender")
+        return False
+    except Exception:
+        logger.warning("Fast preprocessing failed; falling back to Blender", exc_info=True)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+    logger.info(f"Preprocessed file saved to {output_path} (fast path)")
+    return True
+
+def prepare_for_rigging(input_path: str, output_dir: str, cancel_event: threading.Event = None) -> str:
     """
     Convert an uploaded mesh file to a standardized GLB suitable for rigging.
-    Uses Blender in headless mode to:
+    Clean GLB/OBJ/PLY/STL files go through prepare_fast(); everything else uses
+    Blender in headless mode to:
       - Import the mesh
       - Triangulate
       - Apply rotation/scale transforms
@@ -38,11 +240,22 @@ def prepare_for_rigging(input_path: str, output_dir: str) -> str:
     """
     logger.info(f"Preparing file for rigging: {input_path}")
 
-    # Create a temporary output filename
-    base = os.path.basename(input_path)
-    name, _ = os.path.splitext(base)
-    output_path = os.path.join(output_dir, f"{name}_prepared.glb")
+    # Per-job temporary output, so concurrent jobs never share a file
+    fd, output_path = tempfile.mkstemp(suffix='_prepared.glb', prefix='prepare_', dir=output_dir)
+    os.close(fd)
+    try:
+        check_cancelled(cancel_event, 'preprocessing')
+        if prepare_fast(input_path, output_path):
+            return output_path
+        check_cancelled(cancel_event, 'Blender preprocessing')
+        return _prepare_with_blender(input_path, output_path, cancel_event)
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
 
+def _prepare_with_blender(input_path: str, output_path: str, cancel_event: threading.Event = None) -> str:
+    """Preprocess in headless Blender, exporting to output_path."""
     # Blender Python script for preprocessing
     preprocess_script = """
 import bpy
@@ -51,17 +264,28 @@ import sys
 input_file = sys.argv[5]
 output_file = sys.argv[6]
 
+def step(msg):
+    # Progress lines keep the pipeline's output watchdog informed
+    print(f"[preprocess] {msg}", flush=True)
+
 # Clear scene
 bpy.ops.wm.read_factory_settings(use_empty=True)
+step("importing " + input_file)
 
 # Import based on file extension
 if input_file.endswith('.obj'):
     bpy.ops.wm.obj_import(filepath=input_file)
 elif input_file.endswith('.fbx'):
     bpy.ops.import_scene.fbx(filepath=input_file)
+elif input_file.endswith('.ply'):
+    bpy.ops.wm.ply_import(filepath=input_file)
+elif input_file.endswith('.stl'):
+    bpy.ops.wm.stl_import(filepath=input_file)
 else:  # glb/gltf
     bpy.ops.import_scene.gltf(filepath=input_file)
 
+step("imported")
+
 # Select all objects
 bpy.ops.object.select_all(action='SELECT')
 
@@ -69,10 +293,12 @@ bpy.ops.object.select_all(action='SELECT')
 bpy.ops.object.convert(target='MESH')
 
 # Triangulate
+step("triangulating")
 bpy.ops.object.modifier_add(type='TRIANGULATE')
 bpy.ops.object.modifier_apply(modifier='Triangulate')
 
 # Apply transforms (rotation, scale)
+step("applying transforms")
 bpy.ops.object.transform_apply(location=False, rotation=True, scale=True)
 
 # Join all meshes into one (optional – many riggers expect a single mesh)
@@ -81,6 +307,7 @@ if len(bpy.context.selected_objects) > 1:
     bpy.ops.object.join()
 
 # Export as GLB
+step("exporting")
 bpy.ops.export_scene.gltf(
     filepath=output_file,
     export_format='GLB',
@@ -88,9 +315,9 @@ bpy.ops.export_scene.gltf(
     export_animations=False
 )
 """
-    # Write temporary script
-    script_path = os.path.join(tempfile.gettempdir(), 'preprocess_blender.py')
-    with open(script_path, 'w') as f:
+    # Write temporary script (per job: concurrent jobs must not share it)
+    fd, script_path = tempfile.mkstemp(suffix='.py', prefix='preprocess_blender_')
+    with os.fdopen(fd, 'w') as f:
         f.write(preprocess_script)
 
     try:
@@ -98,11 +325,14 @@ bpy.ops.export_scene.gltf(
             'blender', '--background', '--python', script_path,
             '--', input_path, output_path
         ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if result.returncode != 0:
-            logger.error(f"Preprocessing failed: {result.stderr}")
-            raise RuntimeError(f"Preprocessing failed: {result.stderr}")
-        if not os.path.exists(output_path):
+        # Import and export are single operator calls that print nothing for
+        # minutes on large scans, so only the overall timeout applies here
+        returncode, _, stderr = run_blender(cmd, estimate_timeout(input_path, 'prepare'),
+                                            cancel_event, label='Preprocessing', detect_stalls=False)
+        if returncode != 0:
+            logger.error(f"Preprocessing failed: {stderr}")
+            raise RuntimeError(f"Preprocessing failed: {stderr}")
+        if not os.path.exists(output_path) or not os.path.getsize(output_path):
             raise RuntimeError("Preprocessing did not produce output file")
         logger.info(f"Preprocessed file saved to {output_path}")
         return output_path
@@ -110,6 +340,34 @@ bpy.ops.export_scene.gltf(
         if os.path.exists(script_path):
             os.remove(script_path)
 
+# ----------------------------------------------------------------------
+# Incremental re-rigging: per-stage artifact plan
+# ----------------------------------------------------------------------
+def plan_artifacts(store: ArtifactStore, input_path: str, template_path: str, options: dict,
+                   input_hash: str = None) -> dict:
+    """
+    Compute the content-addressed artifact path of every pipeline stage.
+    Each key chains the upstream key with that stage's own parameters, so
+    changing e.g. the smoothing options only invalidates the smoothed weights,
+    while a new template invalidates alignment and everything after it.
+    Pass `input_hash` when the caller already hashed the input (uploads).
+    """
+    # Inputs are one-off files: never memoize their hashes
+    input_hash = input_hash or hash_file(input_path, memo=False)
+    prepared = artifact_key('prepared', STAGE_VERSIONS['prepared'], input_hash)
+    alignment = artifact_key('alignment', STAGE_VERSIONS['alignment'], prepared, hash_file(template_path))
+    raw_weights = artifact_key('raw_weights', STAGE_VERSIONS['raw_weights'], alignment, options['skinning'])
+    smoothed_weights = artifact_key(
+        'smoothed_weights', STAGE_VERSIONS['smoothed_weights'], raw_weights,
+        options['smooth_iterations'], options['smooth_factor'],
+    )
+    return {
+        'prepared': store.path('prepared', prepared, '.glb'),
+        'alignment': store.path('alignment', alignment, '.npy'),
+        'raw_weights': store.path('raw_weights', raw_weights, '.npz'),
+        'smoothed_weights': store.path('smoothed_weights', smoothed_weights, '.npz'),
+    }
+
 # ----------------------------------------------------------------------
 # Post‑processing: optimize rigged GLB for web
 # ----------------------------------------------------------------------
@@ -132,40 +390,74 @@ def optimize_for_web(input_path: str, output_path: str) -> str:
 # ----------------------------------------------------------------------
 # Main pipeline function
 # ----------------------------------------------------------------------
-def run_pipeline(uploaded_file_path: str, output_dir: str, template_path: str = TEMPLATE_PATH) -> str:
+def run_pipeline(uploaded_file_path: str, output_dir: str, template_path: str = TEMPLATE_PATH,
+                 options: dict = None, store: ArtifactStore = None,
+                 cancel_event: threading.Event = None, input_hash: str = None,
+                 workers: int = None) -> str:
     """
     Execute the full rigging pipeline:
       1. Prepare the uploaded file (preprocess)
       2. Run Blender rigging (rigger.py)
       3. Optimize the result
+    Stage outputs are cached in the artifact store; stages whose inputs and
+    parameters are unchanged are loaded instead of recomputed.
+    Setting cancel_event kills any running Blender process (JobCancelled);
+    `input_hash` is the upload's SHA-256 if the caller already computed it;
+    `workers` caps the rigger's correspondence processes (default: all CPUs).
     Returns the path to the final rigged GLB.
     """
-    # Step 1: Preprocess
-    prepared_path = prepare_for_rigging(uploaded_file_path, output_dir)
+    options = resolve_options(options)
+    store = store or ArtifactStore()
+    check_cancelled(cancel_event, 'planning')
+    plan = plan_artifacts(store, uploaded_file_path, template_path, options, input_hash)
+    # Keep this job's cached stages fresh; the server's evictor thread makes room
+    store.touch(*plan.values())
+
+    # Step 1: Preprocess (skipped if this exact input was prepared before)
+    prepared_path = plan['prepared']
+    if os.path.exists(prepared_path):
+        logger.info(f"Reusing prepared mesh {prepared_path}")
+    else:
+        tmp_prepared = prepare_for_rigging(uploaded_file_path, os.path.dirname(prepared_path), cancel_event)
+        store.commit(tmp_prepared, prepared_path)
+    check_cancelled(cancel_event, 'rigging')
 
     # Step 2: Rigging
-    # The rigger.py script expects: input_path template_path output_path
-    rigged_path = os.path.join(output_dir, 'rigged_temp.glb')
+    # The rigger.py script expects: input_path template_path output_path [plan_path]
+    # Per-job output names: concurrent jobs share output_dir
+    fd, rigged_path = tempfile.mkstemp(suffix='.glb', prefix='rigged_', dir=output_dir)
+    os.close(fd)
+    fd, final_path = tempfile.mkstemp(suffix='.glb', prefix='final_rigged_', dir=output_dir)
+    os.close(fd)
+    fd, plan_path = tempfile.mkstemp(suffix='.json', prefix='rig_plan_')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'options': options, 'artifacts': plan}, f)
     cmd = [
         'blender', '--background', '--python', RIGGER_SCRIPT,
-        '--', prepared_path, template_path, rigged_path
+        '--', prepared_path, template_path, rigged_path, plan_path
     ]
     logger.info(f"Running rigger: {' '.join(cmd)}")
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=600)
-    if result.returncode != 0:
-        logger.error(f"Rigging failed: {result.stderr}")
-        raise RuntimeError(f"Rigging failed: {result.stderr}")
-    if not os.path.exists(rigged_path):
-        raise RuntimeError("Rigging succeeded but output file missing")
-
-    # Step 3: Optimize
-    final_path = os.path.join(output_dir, 'final_rigged.glb')
-    optimized_path = optimize_for_web(rigged_path, final_path)
-
-    # Clean up intermediate files (optional)
-    if os.path.exists(prepared_path):
-        os.remove(prepared_path)
-    if os.path.exists(rigged_path):
-        os.remove(rigged_path)
+    try:
+        try:
+            returncode, _, stderr = run_blender(cmd, estimate_timeout(prepared_path, 'rig'),
+                                                cancel_event, label='Rigging', workers=workers)
+        finally:
+            os.remove(plan_path)
+        if returncode != 0:
+            logger.error(f"Rigging failed: {stderr}")
+            raise RuntimeError(f"Rigging failed: {stderr}")
+        if not os.path.getsize(rigged_path):
+            raise RuntimeError("Rigging succeeded but output file missing")
+
+        # Step 3: Optimize
+        check_cancelled(cancel_event, 'optimization')
+        optimized_path = optimize_for_web(rigged_path, final_path)
+    except BaseException:
+        os.remove(final_path)
+        raise
+    finally:
+        # Clean up intermediate files (the prepared mesh stays in the artifact store)
+        if os.path.exists(rigged_path):
+            os.remove(rigged_path)
 
-    return optimized_path
\ No newline at end of file
+    return optimized_path
@@ -0,0 +1,314 @@
+"""
+Pure-NumPy rigging math used by rigger.py.
+Nothing here touches bpy, so every routine can be unit-tested and
+benchmarked from plain Python.
+
+Weights are handled as a "packed" tuple (names, offsets, indices, values):
+group g owns indices[offsets[g]:offsets[g+1]] with matching values.
+"""
+
+import os
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+import correspondence
+
+WEIGHT_EPSILON = 1e-4         # weights below this are dropped when packing
+WEIGHT_QUANTUM = 2.0 ** -16   # vertex groups are written in batches of equal weight
+LOOP_NUDGE = 0.05             # pull loop sample points towards their face centre
+ICP_ITERATIONS = 30
+ICP_SAMPLE = 20000            # template points used per ICP iteration
+ICP_TOLERANCE = 1e-6          # relative change in mean error that ends ICP
+LOW_MEMORY_VERTEX_THRESHOLD = 1000000  # 'auto' low-memory ICP above this many target vertices
+# Working-memory budget for ICP; the server and rigger both default to this
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get('RIG_MEMORY_BUDGET_MB', 512))
+ICP_BYTES_PER_SAMPLE = 256    # per template sample: moved copy, matches, distances, query buffers
+
+# ----------------------------------------------------------------------
+# Transforms
+# ----------------------------------------------------------------------
+def transform_points(matrix, points):
+    """Apply a 4x4 affine matrix to (n, 3) points."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+def similarity_matrix(scale, rotation, translation):
+    """Build the 4x4 matrix x -> scale * R @ x + t."""
+    m = np.eye(4)
+    m[:3, :3] = scale * rotation
+    m[:3, 3] = translation
+    return m
+
+def kabsch(source, target, chunk=1 << 16):
+    """Best rotation and translation mapping paired source points onto target."""
+    s_mean, t_mean, H = streaming_cross_covariance(source, target, chunk)
+    U, _, Vt = np.linalg.svd(H)
+    D = np.eye(3)
+    D[2, 2] = np.sign(np.linalg.det(Vt.T @ U.T)) or 1.0
+    R = Vt.T @ D @ U.T
+    return R, t_mean - R @ s_mean
+
+def transform_points_inplace(matrix, points, chunk=1 << 18):
+    """Apply a 4x4 affine matrix to (n, 3) points in place, one chunk at a time."""
+    matrix = np.asarray(matrix, dtype=np.float64)
+    linear = matrix[:3, :3].T.astype(points.dtype)
+    offset = matrix[:3, 3].astype(points.dtype)
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        block[...] = block @ linear
+        block += offset
+    return points
+
+# ----------------------------------------------------------------------
+# Streaming statistics
+# ----------------------------------------------------------------------
+def budget_rows(memory_budget_mb, bytes_per_row, minimum=4096):
+    """Rows per chunk so that a chunk's float64 temporaries stay well inside the budget."""
+    budget = int(memory_budget_mb * 1024 * 1024)
+    return max(minimum, budget // (8 * bytes_per_row))
+
+def streaming_centroid_rms(points, chunk):
+    """Centroid and RMS radius of (n, 3) points, accumulated in float64 chunks."""
+    n = len(points)
+    total = np.zeros(3)
+    for start in range(0, n, chunk):
+        total += points[start:start + chunk].sum(axis=0, dtype=np.float64)
+    centroid = total / n
+    sq = 0.0
+    for start in range(0, n, chunk):
+        d = points[start:start + chunk] - centroid
+        sq += float(np.einsum('ij,ij->', d, d))
+    return centroid, np.sqrt(sq / n)
+
+def streaming_cross_covariance(source, target, chunk):
+    """
+    Means and 3x3 cross-covariance sum of paired (n, 3) point sets,
+    accumulated over chunks without centred full-size copies.
+    """
+    n = len(source)
+    s_mean = np.zeros(3)
+    t_mean = np.zeros(3)
+    for start in range(0, n, chunk):
+        s_mean += source[start:start + chunk].sum(axis=0, dtype=np.float64)
+        t_mean += target[start:start + chunk].sum(axis=0, dtype=np.float64)
+    s_mean /= n
+    t_mean /= n
+    H = np.zeros((3, 3))
+    for start in range(0, n, chunk):
+        H += (source[start:start + chunk] - s_mean).T @ (target[start:start + chunk] - t_mean)
+    return s_mean, t_mean, H
+
+class PeakMemory:
+    """Context manager reporting peak traced allocation (NumPy buffers included) in bytes."""
+
+    def __enter__(self):
+        self._was_tracing = tracemalloc.is_tracing()
+        if not self._was_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+        self.peak = 0
+        return self
+
+    def __exit__(self, *exc):
+        self.peak = max(0, tracemalloc.get_traced_memory()[1] - self._base)
+        if not self._was_tracing:
+            tracemalloc.stop()
+        return False
+
+def icp_align(target_points, template_points, iterations=ICP_ITERATIONS,
+              sample=ICP_SAMPLE, tolerance=ICP_TOLERANCE, workers=None,
+              low_memory=False, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, progress=None):
+    """
+    Similarity transform (4x4) that moves template points onto the target.
+    Scale comes from the RMS radius ratio; rotation and translation are
+    refined by ICP against nearest target vertices, starting from a
+    centroid-to-centroid fit.
+
+    The budget is split between the streamed statistics (an eighth), the
+    nearest-neighbour search temporaries (a quarter) and, with
+    low_memory=True, the index: the target is then kept as float32 and
+    centred in place (restored before returning), and the index is built
+    over a subsample of the target sized from what is left after the fixed
+    per-sample overhead.
+    `progress(iteration, iterations)` is called after every ICP iteration.
+    """
+    dtype = np.float32 if low_memory else np.float64
+    target_points = np.asarray(target_points, dtype=dtype)
+    template_points = np.asarray(template_points, dtype=np.float64)
+    if len(target_points) == 0 or len(template_points) == 0:
+        raise ValueError("One of the meshes has no vertices.")
+
+    budget = int(memory_budget_mb * 1024 * 1024)
+    chunk = budget_rows(memory_budget_mb, 3 * 8)
+    chunk_size, max_pairs = correspondence.search_limits(budget // 4)
+    t_center, t_scale = streaming_centroid_rms(target_points, chunk)
+    s_center, s_scale = streaming_centroid_rms(template_points, chunk)
+    scale = t_scale / s_scale if s_scale > 0 else 1.0
+
+    step = max(1, len(template_points) // sample)
+    scaled = template_points[::step] * scale
+    R = np.eye(3)
+    # Work in a frame centred on the target so float32 keeps its precision
+    t = scale * -s_center
+    if low_memory:
+        target_points -= t_center.astype(dtype)
+    else:
+        target_points = target_points - t_center
+    try:
+        index_points = target_points
+        if low_memory:
+            # Building the index must fit beside the sample overhead; once built, the
+            # index (about half its build peak) and the search temporaries share the budget
+            index_budget = budget * 3 // 4 - len(scaled) * ICP_BYTES_PER_SAMPLE
+            max_index = max(sample, index_budget // correspondence.INDEX_BYTES_PER_POINT)
+            index_points = target_points[::max(1, -(-len(target_points) // max_index))]
+        index = correspondence.PointIndex(index_points)
+        prev_error = None
+        for iteration in range(iterations):
+            moved = scaled @ R.T + t
+            idx, d2 = index.query(moved, workers=workers, chunk_size=chunk_size, max_pairs=max_pairs)
+            error = d2.mean()
+            if progress:
+                progress(iteration + 1, iterations)
+            if prev_error is not None and abs(prev_error - error) <= tolerance * max(prev_error, 1e-12):
+                break
+            prev_error = error
+            R, t = kabsch(scaled, index_points[idx], chunk)
+    finally:
+        if low_memory:
+            target_points += t_center.astype(dtype)
+    return similarity_matrix(scale, R, t + t_center)
+
+def _atomic_write(path, write):
+    """
+    Call write(f) on a private temp file next to `path`, then rename it into
+    place. Concurrent jobs sharing an artifact key each get their own temp
+    file, so the last rename simply wins.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def save_matrix(path, matrix):
+    """Atomically write a 4x4 matrix artifact."""
+    if not path:
+        return
+    _atomic_write(path, lambda f: np.save(f, np.asarray(matrix, dtype=np.float64)))
+
+def load_matrix(path):
+    """Load a 4x4 matrix artifact, or None if absent."""
+    if not path or not os.path.exists(path):
+        return None
+    return np.load(path)
+
+# ----------------------------------------------------------------------
+# Packed weights
+# ----------------------------------------------------------------------
+def pack_columns(names, columns):
+    """Pack an iterable of dense per-group weight vectors."""
+    offsets = [0]
+    indices, values = [], []
+    for w in columns:
+        idx = np.flatnonzero(w > WEIGHT_EPSILON).astype(np.int32)
+        indices.append(idx)
+        values.append(w[idx].astype(np.float32))
+        offsets.append(offsets[-1] + len(idx))
+    return (list(names), np.array(offsets, dtype=np.int64),
+            np.concatenate(indices) if indices else np.zeros(0, np.int32),
+            np.concatenate(values) if values else np.zeros(0, np.float32))
+
+def pack_weights(names, dense):
+    """Pack a (n_verts, n_groups) dense weight matrix, dropping near-zero weights."""
+    return pack_columns(names, (dense[:, g] for g in range(len(names))))
+
+def group_weights(packed, g, n_verts, dtype=np.float64):
+    """Dense weight vector of group g."""
+    _, offsets, indices, values = packed
+    w = np.zeros(n_verts, dtype=dtype)
+    sl = slice(offsets[g], offsets[g + 1])
+    w[indices[sl]] = values[sl]
+    return w
+
+def save_weights(path, packed):
+    """Atomically write packed weights to an .npz artifact."""
+    if not path:
+        return
+    names, offsets, indices, values = packed
+    _atomic_write(path, lambda f: np.savez(f, names=np.array(names, dtype=str), offsets=offsets,
+                                           indices=indices, values=values))
+
+def load_weights(path):
+    """Load packed weights from an .npz artifact, or None if absent."""
+    if not path or not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return (data['names'].tolist(), data['offsets'], data['indices'], data['values'])
+
+def interpolate_weights(names, source_weights, corner_verts, bary):
+    """
+    Blend source vertex weights (n_src, n_groups) at each target's triangle
+    corners (n, 3) with barycentric coords (n, 3). Returns packed weights.
+    """
+    return pack_columns(names, ((bary * source_weights[corner_verts, g]).sum(axis=1)
+                                 for g in range(len(names))))
+
+def smooth_weights(packed, edges, n_verts, iterations=10, factor=0.5, progress=None):
+    """
+    Laplacian smoothing of packed weights over a mesh edge list.
+    Each iteration blends every vertex's weights towards the mean of its
+    edge neighbours; being a convex average it preserves normalized weights.
+    Groups are processed one at a time to keep memory at a few dense vectors;
+    `progress(done, total)` is called after each group.
+    """
+    names = packed[0]
+    a, b = edges[:, 0], edges[:, 1]
+    degree = np.bincount(edges.ravel(), minlength=n_verts).astype(np.float64)
+    inv_degree = np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 0)
+    connected = degree > 0
+
+    def smoothed_columns():
+        for g in range(len(names)):
+            w = group_weights(packed, g, n_verts)
+            for _ in range(iterations):
+                neighbour_mean = (np.bincount(a, w[b], n_verts) + np.bincount(b, w[a], n_verts)) * inv_degree
+                w += factor * np.where(connected, neighbour_mean - w, 0.0)
+            if progress:
+                progress(g + 1, len(names))
+            yield w
+
+    return pack_columns(names, smoothed_columns())
+
+def weight_batches(indices, values):
+    """
+    Yield (vertex indices, weight) batches of equal quantized weight, so a
+    vertex group can be filled with one add() call per distinct value.
+    """
+    q = np.round(values / WEIGHT_QUANTUM).astype(np.int64)
+    order = np.argsort(q, kind='stable')
+    q_sorted = q[order]
+    idx_sorted = indices[order]
+    levels, starts = np.unique(q_sorted, return_index=True)
+    bounds = np.append(starts, len(q_sorted))
+    for i, level in enumerate(levels):
+        yield idx_sorted[bounds[i]:bounds[i + 1]], float(level * WEIGHT_QUANTUM)
+
+# ----------------------------------------------------------------------
+# Loops
+# ----------------------------------------------------------------------
+def loop_sample_points(verts, loop_verts, loop_start, loop_total, nudge=LOOP_NUDGE):
+    """
+    One sample point per loop: its vertex, nudged towards the face centre so
+    loops on either side of a UV seam land on the matching source face.
+    """
+    pos = verts[loop_verts]
+    centres = np.add.reduceat(pos, loop_start, axis=0) / loop_total[:, None]
+    return pos + nudge * (np.repeat(centres, loop_total, axis=0) - pos)
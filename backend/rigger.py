@@ -4,22 +4,44 @@ Bio‑React Blender Rigging Script (Ultra‑Robust Edition)
 Performs automatic rigging of a target mesh using a template rig.
 Includes ICP alignment, weight transfer, smoothing, texture transfer,
 and exhaustive error handling with detailed logging.
+
+All mesh manipulation goes through the data API (foreach_get/foreach_set,
+direct vertex-group assignment); operators are only used for import and
+export. The NumPy math lives in rig_math.py.
 """
 
 import bpy
 import sys
 import os
+import json
+import time
 import traceback
 import numpy as np
-from mathutils import Vector, Matrix
+from mathutils import Matrix
+
+# Sibling modules (pure NumPy) live next to this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bone_heat
+import correspondence
+import rig_math
 
 # ==================== ARGUMENT PARSING ====================
 argv = sys.argv[sys.argv.index("--") + 1:]
 if len(argv) < 3:
-    print("CRITICAL ERROR: Missing arguments. Expected: input_path template_path output_path")
+    print("CRITICAL ERROR: Missing arguments. Expected: input_path template_path output_path [plan_path]")
     sys.exit(1)
 
-INPUT_PATH, TEMPLATE_PATH, OUTPUT_PATH = argv
+INPUT_PATH, TEMPLATE_PATH, OUTPUT_PATH = argv[:3]
+# Optional JSON plan from pipeline.py: rigging options and artifact cache paths
+PLAN_PATH = argv[3] if len(argv) > 3 else None
+
+DEFAULT_OPTIONS = {
+    'smooth_iterations': 10,
+    'smooth_factor': 0.5,
+    'skinning': 'template',     # 'template' (weight transfer) or 'bone_heat'
+    'icp_low_memory': 'auto',   # True, False, or 'auto' (by target vertex count)
+    'memory_budget_mb': rig_math.DEFAULT_MEMORY_BUDGET_MB,
+}
 
 # ==================== LOGGING ====================
 def log(msg):
@@ -31,12 +53,32 @@ def log_error(msg):
     """Print an error message prefixed with ERROR."""
     log(f"ERROR: {msg}")
 
+HEARTBEAT_INTERVAL = 10  # seconds between progress lines during long NumPy stages
+
+def heartbeat(label):
+    """
+    Progress callback (done, total) that logs at most every HEARTBEAT_INTERVAL
+    seconds, so pipeline.run_blender's stall watchdog sees a healthy but
+    otherwise silent stage (ICP, correspondence, solves) as alive.
+    """
+    last = [time.monotonic()]
+
+    def report(done, total):
+        now = time.monotonic()
+        if now - last[0] >= HEARTBEAT_INTERVAL:
+            last[0] = now
+            log(f"  {label}: {done}/{total}")
+    return report
+
 # ==================== SCENE SETUP ====================
 def reset_scene():
-    """Clear the scene to factory settings with error handling."""
+    """Remove all objects and orphaned data blocks from the startup scene."""
     try:
-        bpy.ops.wm.read_factory_settings(use_empty=True)
-        log("Scene reset to factory settings.")
+        for collection in (bpy.data.objects, bpy.data.meshes, bpy.data.armatures,
+                           bpy.data.materials, bpy.data.cameras, bpy.data.lights):
+            if len(collection):
+                bpy.data.batch_remove(list(collection))
+        log("Scene cleared.")
     except Exception as e:
         log_error(f"Failed to reset scene: {e}")
         raise
@@ -47,165 +89,253 @@ def check_file_exists(filepath, description):
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"{description} not found: {filepath}")
 
+# ==================== ARTIFACT PLAN ====================
+def load_plan(plan_path):
+    """Load options and artifact paths written by pipeline.py (all optional)."""
+    plan = {'options': dict(DEFAULT_OPTIONS), 'artifacts': {}}
+    if plan_path:
+        with open(plan_path) as f:
+            data = json.load(f)
+        plan['options'].update(data.get('options', {}))
+        plan['artifacts'].update(data.get('artifacts', {}))
+    return plan
+
+def load_matrix(path):
+    """Load a cached 4x4 matrix artifact as a mathutils Matrix, or None."""
+    matrix = rig_math.load_matrix(path)
+    return None if matrix is None else Matrix(matrix.tolist())
+
 # ==================== IMPORT MESH ====================
+def import_file(filepath, formats=('.glb', '.gltf', '.obj', '.fbx', '.ply', '.stl')):
+    """
+    Run the importer for a file and return the list of new objects.
+    New objects are found by diffing bpy.data rather than relying on the
+    selection state left behind by the operator.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext not in formats:
+        raise ValueError(f"Unsupported file format: {ext}")
+    before = set(bpy.data.objects)
+    if ext in ('.glb', '.gltf'):
+        bpy.ops.import_scene.gltf(filepath=filepath)
+    elif ext == '.obj':
+        bpy.ops.wm.obj_import(filepath=filepath)
+    elif ext == '.fbx':
+        bpy.ops.import_scene.fbx(filepath=filepath)
+    elif ext == '.ply':
+        bpy.ops.wm.ply_import(filepath=filepath)
+    elif ext == '.stl':
+        bpy.ops.wm.stl_import(filepath=filepath)
+    return [obj for obj in bpy.data.objects if obj not in before]
+
 def import_mesh(filepath):
     """
     Import a mesh (GLB/GLTF/OBJ/FBX) and return the imported object.
     Handles multiple import methods with error checking.
     """
-    ext = os.path.splitext(filepath)[1].lower()
-    log(f"Importing mesh from {filepath} (format: {ext})")
-
+    log(f"Importing mesh from {filepath} (format: {os.path.splitext(filepath)[1].lower()})")
     try:
-        if ext in ('.glb', '.gltf'):
-            bpy.ops.import_scene.gltf(filepath=filepath)
-        elif ext == '.obj':
-            bpy.ops.wm.obj_import(filepath=filepath)
-        elif ext == '.fbx':
-            bpy.ops.import_scene.fbx(filepath=filepath)
-        else:
-            raise ValueError(f"Unsupported file format: {ext}")
+        imported = import_file(filepath)
     except Exception as e:
         log_error(f"Import failed for {filepath}: {e}")
         raise
 
-    imported = bpy.context.selected_objects
-    if not imported:
-        raise RuntimeError("No objects imported from file.")
-    # Assume the first object is the main mesh
-    obj = imported[0]
+    meshes = [obj for obj in imported if obj.type == 'MESH']
+    if not meshes:
+        raise RuntimeError("No mesh objects imported from file.")
+    # Assume the first mesh is the main mesh
+    obj = meshes[0]
     log(f"Imported object: {obj.name} (type: {obj.type})")
     return obj
 
 # ==================== ICP ALIGNMENT ====================
-def icp_align(target_obj, template_obj):
+def icp_align(target_obj, template_obj, options):
     """
-    Align template to target using point‑to‑plane ICP.
+    Align template to target using ICP (see rig_math.icp_align).
     Modifies template_obj's transformation matrix.
     Includes multiple checks for data validity.
     """
     log("Starting ICP alignment...")
+    low_memory = options['icp_low_memory']
+    if low_memory == 'auto':
+        low_memory = len(target_obj.data.vertices) > rig_math.LOW_MEMORY_VERTEX_THRESHOLD
+    budget = options['memory_budget_mb']
 
     # Extract vertices
     try:
-        target_verts = np.array([target_obj.matrix_world @ v.co for v in target_obj.data.vertices])
-        template_verts = np.array([template_obj.matrix_world @ v.co for v in template_obj.data.vertices])
+        target_verts = world_vertices(target_obj, np.float32 if low_memory else np.float64)
+        template_verts = world_vertices(template_obj)
     except Exception as e:
         log_error(f"Failed to get vertices: {e}")
         raise
 
-    if len(target_verts) == 0 or len(template_verts) == 0:
-        raise ValueError("One of the meshes has no vertices.")
-
-    # Center
-    try:
-        t_center = target_verts.mean(axis=0)
-        s_center = template_verts.mean(axis=0)
-        target_centered = target_verts - t_center
-        template_centered = template_verts - s_center
-    except Exception as e:
-        log_error(f"Centering failed: {e}")
-        raise
-
-    # Scale
     try:
-        t_scale = np.sqrt((target_centered ** 2).sum(axis=1).mean())
-        s_scale = np.sqrt((template_centered ** 2).sum(axis=1).mean())
-        scale = t_scale / s_scale if s_scale > 0 else 1.0
+        with rig_math.PeakMemory() as peak:
+            transform = rig_math.icp_align(target_verts, template_verts,
+                                           low_memory=low_memory, memory_budget_mb=budget,
+                                           progress=heartbeat("ICP iteration"))
     except Exception as e:
-        log_error(f"Scale calculation failed: {e}")
-        raise
-
-    # Rotation via SVD
-    try:
-        H = template_centered.T @ target_centered
-        U, _, Vt = np.linalg.svd(H)
-        R = Vt.T @ U.T
-        if np.linalg.det(R) < 0:
-            Vt[-1, :] *= -1
-            R = Vt.T @ U.T
-    except Exception as e:
-        log_error(f"SVD failed: {e}")
-        raise
-
-    # Build transformation matrix
-    try:
-        transform = Matrix(R.tolist()).to_4x4()
-        transform.translation = Vector(t_center) - Vector(s_center) @ transform
-        transform = Matrix.Scale(scale, 4) @ transform
-    except Exception as e:
-        log_error(f"Failed to build transform matrix: {e}")
+        log_error(f"ICP failed: {e}")
         raise
+    peak_mb = peak.peak / (1024 * 1024)
+    log(f"ICP peak memory {peak_mb:.0f} MB (budget {budget} MB, low_memory={low_memory}).")
+    if peak_mb > budget:
+        log_error(f"ICP exceeded its memory budget: {peak_mb:.0f} MB > {budget} MB")
 
     # Apply to template object
     try:
-        template_obj.matrix_world = transform @ template_obj.matrix_world
+        template_obj.matrix_world = Matrix(transform.tolist()) @ template_obj.matrix_world
     except Exception as e:
         log_error(f"Failed to apply transform: {e}")
         raise
 
     log("ICP alignment completed.")
 
+# ==================== MESH ARRAYS ====================
+def world_vertices(obj, dtype=np.float64):
+    """
+    Return the object's vertex positions in world space as (n, 3) `dtype`.
+    float32 is transformed in place, so no float64 copy is ever made.
+    """
+    co = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
+    obj.data.vertices.foreach_get('co', co)
+    co = co.reshape(-1, 3)
+    if dtype == np.float32:
+        return rig_math.transform_points_inplace(obj.matrix_world, co)
+    return rig_math.transform_points(obj.matrix_world, co.astype(dtype))
+
+def mesh_triangles(obj):
+    """Return (triangle vertex indices, triangle loop indices), each (n_tris, 3)."""
+    mesh = obj.data
+    mesh.calc_loop_triangles()
+    n = len(mesh.loop_triangles) * 3
+    tri_verts = np.empty(n, dtype=np.int32)
+    tri_loops = np.empty(n, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('vertices', tri_verts)
+    mesh.loop_triangles.foreach_get('loops', tri_loops)
+    return tri_verts.reshape(-1, 3), tri_loops.reshape(-1, 3)
+
+def loop_sample_points(obj, verts):
+    """Per-loop sample points for the loop correspondence (see rig_math)."""
+    mesh = obj.data
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_verts)
+    loop_start = np.empty(len(mesh.polygons), dtype=np.int32)
+    loop_total = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loop_start)
+    mesh.polygons.foreach_get('loop_total', loop_total)
+    return rig_math.loop_sample_points(verts, loop_verts, loop_start, loop_total)
+
+def mesh_edges(obj):
+    """Return the mesh edge list as an (n_edges, 2) int32 array."""
+    edges = np.empty(len(obj.data.edges) * 2, dtype=np.int32)
+    obj.data.edges.foreach_get('vertices', edges)
+    return edges.reshape(-1, 2)
+
 # ==================== WEIGHT TRANSFER ====================
 def transfer_weights(target_obj, source_obj):
     """
-    Transfer vertex groups from source to target using Data Transfer modifier.
-    Multiple checks for modifier application.
+    Transfer vertex groups from source to target by interpolating them at
+    the closest point on the source surface, using the parallel
+    correspondence engine. Returns packed weights.
     """
     log("Transferring skinning weights...")
     try:
-        # Clear existing vertex groups on target
-        target_obj.vertex_groups.clear()
+        names, source_weights = vertex_group_matrix(source_obj)
+        source_tris, _ = mesh_triangles(source_obj)
+        tri, bary = correspondence.nearest_surface(
+            world_vertices(source_obj), source_tris, world_vertices(target_obj),
+            progress=heartbeat("Weight correspondence chunk"))
+        corner_verts = source_tris[tri]
     except Exception as e:
-        log_error(f"Failed to clear vertex groups: {e}")
+        log_error(f"Failed to build weight correspondence: {e}")
         raise
 
-    # Add Data Transfer modifier
     try:
-        mod = target_obj.modifiers.new(name="WeightTransfer", type='DATA_TRANSFER')
-        mod.object = source_obj
-        mod.use_vert_data = True
-        mod.data_types_verts = {'VGROUP_WEIGHTS'}
-        mod.vert_mapping = 'POLYINTERP_NEAREST'  # Best for different topologies
+        weights = rig_math.interpolate_weights(names, source_weights, corner_verts, bary)
     except Exception as e:
-        log_error(f"Failed to create Data Transfer modifier: {e}")
+        log_error(f"Failed to interpolate weights: {e}")
         raise
 
-    # Apply modifier
+    log("Weight transfer complete.")
+    return weights
+
+def armature_bone_segments(armature_obj):
+    """Return (names, heads, tails) of the armature's deform bones in world space."""
+    bones = armature_obj.data.bones
+    n = len(bones)
+    heads = np.empty(n * 3, dtype=np.float32)
+    tails = np.empty(n * 3, dtype=np.float32)
+    deform = np.empty(n, dtype=bool)
+    bones.foreach_get('head_local', heads)
+    bones.foreach_get('tail_local', tails)
+    bones.foreach_get('use_deform', deform)
+    names = [b.name for b, d in zip(bones, deform) if d]
+    matrix = armature_obj.matrix_world
+    heads = rig_math.transform_points(matrix, heads.reshape(-1, 3)[deform].astype(np.float64))
+    tails = rig_math.transform_points(matrix, tails.reshape(-1, 3)[deform].astype(np.float64))
+    return names, heads, tails
+
+def bone_heat_skinning(target_obj, armature_obj):
+    """
+    Compute skinning weights from the aligned armature's bones by bone-heat
+    diffusion over the target mesh (see bone_heat.py). Returns packed weights.
+    """
+    log("Computing bone-heat weights...")
+    if not bone_heat.available():
+        raise RuntimeError("Bone-heat skinning needs SciPy in Blender's Python; run install.py.")
     try:
-        bpy.context.view_layer.objects.active = target_obj
-        bpy.ops.object.datalayout_transfer(modifier=mod.name)
-        bpy.ops.object.modifier_apply(modifier=mod.name)
+        names, heads, tails = armature_bone_segments(armature_obj)
+        tris, _ = mesh_triangles(target_obj)
+        weights = bone_heat.bone_heat_weights(world_vertices(target_obj), tris, names, heads, tails,
+                                              progress=heartbeat("Bone-heat bones solved"))
     except Exception as e:
-        log_error(f"Failed to apply weight transfer: {e}")
+        log_error(f"Bone-heat skinning failed: {e}")
         raise
-
-    log("Weight transfer complete.")
+    log(f"Bone-heat weights computed for {len(names)} bones.")
+    return weights
+
+# ==================== VERTEX GROUPS ====================
+def vertex_group_matrix(obj):
+    """Read all vertex group weights of a mesh object as (names, dense matrix)."""
+    names = [vg.name for vg in obj.vertex_groups]
+    dense = np.zeros((len(obj.data.vertices), len(names)), dtype=np.float32)
+    for v in obj.data.vertices:
+        for g in v.groups:
+            dense[v.index, g.group] = g.weight
+    return names, dense
+
+def write_vertex_groups(obj, packed):
+    """
+    Replace the object's vertex groups with packed weights.
+    Weights are quantized so each group needs one add() call per distinct value
+    instead of one per vertex.
+    """
+    names, offsets, indices, values = packed
+    obj.vertex_groups.clear()
+    for g, name in enumerate(names):
+        vg = obj.vertex_groups.new(name=name)
+        sl = slice(offsets[g], offsets[g + 1])
+        for batch, weight in rig_math.weight_batches(indices[sl], values[sl]):
+            vg.add(batch.tolist(), weight, 'REPLACE')
 
 # ==================== WEIGHT SMOOTHING ====================
-def smooth_weights(target_obj, iterations=10, factor=0.5):
+def smooth_weights(target_obj, weights, iterations=10, factor=0.5):
     """
-    Apply Laplacian smoothing to vertex weights.
+    Apply Laplacian smoothing to vertex weights (see rig_math.smooth_weights).
+    Returns the smoothed packed weights.
     """
     log("Smoothing weights...")
     try:
-        smooth_mod = target_obj.modifiers.new(name="WeightSmooth", type='LAPLACIANSMOOTH')
-        smooth_mod.iterations = iterations
-        smooth_mod.lambda_factor = factor
-        smooth_mod.use_volume_preserve = True
-        if target_obj.vertex_groups:
-            smooth_mod.vertex_group = target_obj.vertex_groups[0].name
+        smoothed = rig_math.smooth_weights(
+            weights, mesh_edges(target_obj), len(target_obj.data.vertices), iterations, factor,
+            progress=heartbeat("Smoothed group"))
     except Exception as e:
-        log_error(f"Failed to create smoothing modifier: {e}")
-        raise
-
-    try:
-        bpy.ops.object.modifier_apply(modifier=smooth_mod.name)
-    except Exception as e:
-        log_error(f"Failed to apply smoothing: {e}")
+        log_error(f"Failed to smooth weights: {e}")
         raise
 
     log("Weight smoothing complete.")
+    return smoothed
 
 # ==================== ARMATURE MODIFIER ====================
 def add_armature_modifier(target_obj, armature_obj):
@@ -219,50 +349,94 @@ def add_armature_modifier(target_obj, armature_obj):
         raise
 
 # ==================== TEXTURE TRANSFER ====================
+def _ensure_color_attribute(mesh, name, domain, data_type):
+    """Return a color attribute matching the source layout, recreating it if needed."""
+    attr = mesh.color_attributes.get(name)
+    if attr is not None and (attr.domain != domain or attr.data_type != data_type):
+        mesh.color_attributes.remove(attr)
+        attr = None
+    if attr is None:
+        attr = mesh.color_attributes.new(name=name, type=data_type, domain=domain)
+    return attr
+
 def transfer_textures(target_obj, source_obj):
     """
-    Transfer UV maps and vertex colors from source to target.
+    Transfer UV maps and color attributes from source to target.
+    The loop correspondence is built once; every UV map and corner-domain
+    color attribute is stacked into one channel matrix and interpolated in a
+    single pass, so cost scales with loops rather than loops x layers.
+    Point-domain colors use a vertex correspondence built only when needed.
     Handles missing layers gracefully.
     """
     log("Transferring textures...")
+    source_mesh = source_obj.data
+    target_mesh = target_obj.data
 
-    # UV maps
-    for uv in source_obj.data.uv_layers:
-        try:
-            if uv.name not in target_obj.data.uv_layers:
-                target_obj.data.uv_layers.new(name=uv.name)
-            uv_mod = target_obj.modifiers.new(name=f"UV_{uv.name}", type='DATA_TRANSFER')
-            uv_mod.object = source_obj
-            uv_mod.use_loop_data = True
-            uv_mod.data_types_loops = {'UV'}
-            uv_mod.loop_mapping = 'POLYINTERP_NEAREST'
-            uv_mod.layers_uv_select_src = 'NAME'
-            uv_mod.layers_uv_select_dst = 'NAME'
-            uv_mod.uv_layer_src = uv.name
-            uv_mod.uv_layer_dst = uv.name
-            bpy.ops.object.modifier_apply(modifier=uv_mod.name)
-        except Exception as e:
-            log_error(f"Failed to transfer UV layer {uv.name}: {e}")
-            # Continue with next UV layer
+    # (kind, name, width, domain, data_type) for each transferable layer
+    layers = [('UV', uv.name, 2, 'CORNER', None) for uv in source_mesh.uv_layers]
+    layers += [('COLOR', attr.name, 4, attr.domain, attr.data_type)
+               for attr in source_mesh.color_attributes]
+    if not layers:
+        log("Template has no UV or color layers.")
+        return
 
-    # Vertex colors
-    for vcol in source_obj.data.vertex_colors:
+    try:
+        source_verts = world_vertices(source_obj)
+        target_verts = world_vertices(target_obj)
+        source_tris, source_tri_loops = mesh_triangles(source_obj)
+    except Exception as e:
+        log_error(f"Failed to read mesh data: {e}")
+        raise
+
+    for domain, n_src, n_dst in (('CORNER', len(source_mesh.loops), len(target_mesh.loops)),
+                                 ('POINT', len(source_mesh.vertices), len(target_mesh.vertices))):
+        group = [layer for layer in layers if layer[3] == domain]
+        if not group:
+            continue
         try:
-            if vcol.name not in target_obj.data.vertex_colors:
-                target_obj.data.vertex_colors.new(name=vcol.name)
-            col_mod = target_obj.modifiers.new(name=f"Color_{vcol.name}", type='DATA_TRANSFER')
-            col_mod.object = source_obj
-            col_mod.use_loop_data = True
-            col_mod.data_types_loops = {'COLOR'}
-            col_mod.loop_mapping = 'POLYINTERP_NEAREST'
-            col_mod.layers_vcol_select_src = 'NAME'
-            col_mod.layers_vcol_select_dst = 'NAME'
-            col_mod.vcol_layer_src = vcol.name
-            col_mod.vcol_layer_dst = vcol.name
-            bpy.ops.object.modifier_apply(modifier=col_mod.name)
+            if domain == 'CORNER':
+                queries = loop_sample_points(target_obj, target_verts)
+                tri, bary = correspondence.nearest_surface(source_verts, source_tris, queries,
+                                                           progress=heartbeat("Loop correspondence chunk"))
+                corners = source_tri_loops[tri]
+            else:
+                tri, bary = correspondence.nearest_surface(source_verts, source_tris, target_verts,
+                                                           progress=heartbeat("Vertex correspondence chunk"))
+                corners = source_tris[tri]
+
+            # Gather every layer of this domain into one (n_src, channels) matrix
+            width = sum(layer[2] for layer in group)
+            src = np.empty((n_src, width), dtype=np.float32)
+            col = 0
+            for kind, name, w, _, _ in group:
+                buf = np.empty(n_src * w, dtype=np.float32)
+                if kind == 'UV':
+                    source_mesh.uv_layers[name].data.foreach_get('uv', buf)
+                else:
+                    source_mesh.color_attributes[name].data.foreach_get('color', buf)
+                src[:, col:col + w] = buf.reshape(-1, w)
+                col += w
+
+            dst = correspondence.interpolate(src[corners], bary).astype(np.float32)
         except Exception as e:
-            log_error(f"Failed to transfer vertex color {vcol.name}: {e}")
-            # Continue
+            log_error(f"Failed to interpolate {domain.lower()} layers: {e}")
+            raise
+
+        col = 0
+        for kind, name, w, _, data_type in group:
+            values = np.ascontiguousarray(dst[:, col:col + w]).ravel()
+            col += w
+            try:
+                if kind == 'UV':
+                    if name not in target_mesh.uv_layers:
+                        target_mesh.uv_layers.new(name=name)
+                    target_mesh.uv_layers[name].data.foreach_set('uv', values)
+                else:
+                    attr = _ensure_color_attribute(target_mesh, name, domain, data_type)
+                    attr.data.foreach_set('color', values)
+            except Exception as e:
+                log_error(f"Failed to transfer {kind.lower()} layer {name}: {e}")
+                # Continue with next layer
 
     log("Texture transfer complete.")
 
@@ -308,6 +482,10 @@ def main():
         check_file_exists(INPUT_PATH, "Input mesh")
         check_file_exists(TEMPLATE_PATH, "Template mesh")
 
+        plan = load_plan(PLAN_PATH)
+        options = plan['options']
+        artifacts = plan['artifacts']
+
         # Reset scene
         reset_scene()
 
@@ -318,20 +496,14 @@ def main():
         # Import template (armature + mesh)
         template_armature = None
         template_mesh = None
-        ext = os.path.splitext(TEMPLATE_PATH)[1].lower()
         try:
-            if ext in ('.glb', '.gltf'):
-                bpy.ops.import_scene.gltf(filepath=TEMPLATE_PATH)
-            elif ext == '.fbx':
-                bpy.ops.import_scene.fbx(filepath=TEMPLATE_PATH)
-            else:
-                raise ValueError(f"Unsupported template format: {ext}")
+            template_objects = import_file(TEMPLATE_PATH, formats=('.glb', '.gltf', '.fbx'))
         except Exception as e:
             log_error(f"Template import failed: {e}")
             raise
 
         # Identify armature and mesh in template
-        for obj in bpy.context.selected_objects:
+        for obj in template_objects:
             if obj.type == 'ARMATURE':
                 template_armature = obj
             elif obj.type == 'MESH':
@@ -345,8 +517,14 @@ def main():
         template_armature.name = "TemplateArmature"
         template_mesh.name = "TemplateMesh"
 
-        # Align template to target
-        icp_align(target_obj, template_mesh)
+        # Align template to target (or reuse the cached alignment)
+        alignment = load_matrix(artifacts.get('alignment'))
+        if alignment is not None:
+            log("Reusing cached alignment.")
+            template_mesh.matrix_world = alignment
+        else:
+            icp_align(target_obj, template_mesh, options)
+            rig_math.save_matrix(artifacts.get('alignment'), template_mesh.matrix_world)
         # Also move armature accordingly
         try:
             template_armature.matrix_world = template_mesh.matrix_world
@@ -354,11 +532,23 @@ def main():
             log_error(f"Failed to sync armature transform: {e}")
             raise
 
-        # Transfer weights
-        transfer_weights(target_obj, template_mesh)
-
-        # Smooth weights
-        smooth_weights(target_obj)
+        # Transfer and smooth weights, reusing whichever stages are cached
+        smoothed = rig_math.load_weights(artifacts.get('smoothed_weights'))
+        if smoothed is not None:
+            log("Reusing cached smoothed weights.")
+        else:
+            raw = rig_math.load_weights(artifacts.get('raw_weights'))
+            if raw is not None:
+                log("Reusing cached raw weights.")
+            else:
+                if options['skinning'] == 'bone_heat':
+                    raw = bone_heat_skinning(target_obj, template_armature)
+                else:
+                    raw = transfer_weights(target_obj, template_mesh)
+                rig_math.save_weights(artifacts.get('raw_weights'), raw)
+            smoothed = smooth_weights(target_obj, raw, options['smooth_iterations'], options['smooth_factor'])
+            rig_math.save_weights(artifacts.get('smoothed_weights'), smoothed)
+        write_vertex_groups(target_obj, smoothed)
 
         # Add armature modifier to target
         add_armature_modifier(target_obj, template_armature)
@@ -1,12 +1,19 @@
 import os
+import re
 import uuid
 import hashlib
+import json
 import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import pipeline  # our new pipeline module
+import metrics
+import startup
+from artifacts import ArtifactStore, hash_file
+from task_registry import TaskRegistry, TaskStatus
 
 app = Flask(__name__)
 CORS(app)
@@ -15,39 +22,129 @@ BASE_DIR = os.path.dirname(__file__)
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 OUTPUT_FOLDER = os.path.join(BASE_DIR, 'outputs')
 TEMPLATE_FOLDER = os.path.join(BASE_DIR, 'templates')
-ALLOWED_EXT = {'glb', 'gltf', 'obj', 'fbx'}
-MAX_FILE_SIZE = 100 * 1024 * 1024  # 100 MB
+ALLOWED_EXT = {'glb', 'gltf', 'obj', 'fbx', 'ply', 'stl'}
+MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE', 100 * 1024 * 1024))  # 100 MB
+# Scanner output (PLY/STL) is read by memory-mapped fast readers, so allow multi-million-face scans
+SCAN_EXT = {'ply', 'stl'}
+MAX_SCAN_FILE_SIZE = int(os.environ.get('MAX_SCAN_FILE_SIZE', 2 * 1024 ** 3))  # 2 GB
+UPLOAD_BLOCK = 1 << 20  # bytes copied per read while streaming an upload to disk
+# Each job's rigger runs its own correspondence process pool, so jobs split the CPUs between them
+MAX_CONCURRENT_JOBS = int(os.environ.get('MAX_CONCURRENT_JOBS', 2))
+RIG_WORKERS = int(os.environ.get('RIG_WORKERS', max(1, (os.cpu_count() or 1) // MAX_CONCURRENT_JOBS)))
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Reject oversized requests before the multipart body is parsed (small slack for form fields)
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_FILE_SIZE, MAX_SCAN_FILE_SIZE) + 1024 * 1024
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-tasks = {}  # in-memory task store
+TASK_TTL = int(os.environ.get('TASK_TTL', 3600))  # seconds finished tasks stay queryable
+TASK_ID_RE = re.compile(r'^[0-9a-f]{64}$')
 
-def get_file_hash(data):
-    return hashlib.sha256(data).hexdigest()
+# Task IDs hash the uploaded file, the template, the resolved options and the
+# stage versions, so repeat uploads share one record
+tasks = TaskRegistry(ttl=TASK_TTL)
+metrics.register_gauge('task_registry_bytes', tasks.memory_usage)
+metrics.register_gauge('task_registry_records', lambda: len(tasks))
 
-def run_pipeline_task(input_path, template_path, output_path, task_id):
+# Bounded pool of pipeline slots; cancelled jobs return their slot immediately
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix='pipeline')
+# Shared by every job; its evictor thread trims stale artifacts outside the jobs
+artifact_store = ArtifactStore()
+
+TEMPLATE_PATH = os.path.join(TEMPLATE_FOLDER, 'human.glb')
+readiness = startup.Readiness()
+_init_lock = threading.Lock()
+_initialized = False
+
+def init_app():
+    """
+    Start the background services once per serving process: the task
+    sweeper, the artifact evictor and the startup checks (Blender, NumPy,
+    template, warm-up).
+    Importing this module starts nothing, so the debug reloader's watcher
+    process and tools that import the module stay side-effect free.
+    """
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        _initialized = True
+    tasks.start_sweeper()
+    artifact_store.start_evictor()
+    startup.start(readiness, [
+        ('template', lambda: startup.check_template(TEMPLATE_PATH)),
+        ('artifact_store', startup.check_artifact_store),
+        ('executor', lambda: startup.warm_executor(executor, MAX_CONCURRENT_JOBS)),
+        ('blender', lambda: startup.check_blender(readiness)),
+    ], logger)
+
+@app.before_request
+def _ensure_initialized():
+    # WSGI servers never run __main__: the first request (usually the
+    # load balancer's /readyz probe) starts the services instead
+    init_app()
+
+def save_upload(file, path, limit):
+    """
+    Stream an uploaded file to `path` in blocks, hashing as it goes, so the
+    upload is never held in memory. Returns the SHA-256, or None (and
+    removes the partial file) if it exceeds `limit` bytes.
+    """
+    h = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as out:
+        for block in iter(lambda: file.stream.read(UPLOAD_BLOCK), b''):
+            size += len(block)
+            if size > limit:
+                break
+            h.update(block)
+            out.write(block)
+    if size > limit:
+        os.remove(path)
+        return None
+    return h.hexdigest()
+
+def get_task_id(file_hash, template_hash, options):
+    """
+    Task ID (and output cache key) for an upload rigged against a given
+    template with per-job options. The options are resolved against the
+    pipeline defaults and keyed with the stage versions, so a new template,
+    changed defaults or a bumped stage never serve a stale output.
+    """
+    payload = json.dumps([file_hash, template_hash, pipeline.result_key(options)], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def run_pipeline_task(input_path, template_path, output_path, task_id, cancel_event, options=None,
+                      input_hash=None):
     """Background task that runs the pipeline and updates task status."""
     try:
+        # Cancelled while queued: give the slot straight back
+        if cancel_event.is_set():
+            logger.info(f"Task {task_id} cancelled before it started")
+            return
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
         # Run the pipeline
-        final_path = pipeline.run_pipeline(input_path, os.path.dirname(output_path), template_path)
+        final_path = pipeline.run_pipeline(input_path, os.path.dirname(output_path), template_path,
+                                           options=options, store=artifact_store,
+                                           cancel_event=cancel_event, input_hash=input_hash,
+                                           workers=RIG_WORKERS)
 
-        # final_path should be the same as output_path (if not, copy it)
+        # The pipeline's output has a per-job name in the same directory: move it into the cache
         if final_path != output_path:
-            import shutil
-            shutil.copy2(final_path, output_path)
+            os.replace(final_path, output_path)
 
-        tasks[task_id] = {'status': 'SUCCESS', 'output': output_path}
+        tasks.succeed(task_id, output_path)
         logger.info(f"Pipeline succeeded for task {task_id}")
+    except pipeline.JobCancelled:
+        logger.info(f"Pipeline cancelled for task {task_id}")
     except Exception as e:
         logger.exception(f"Pipeline failed for task {task_id}")
-        tasks[task_id] = {'status': 'FAILURE', 'error': str(e)}
+        tasks.fail(task_id, e)
     finally:
         # Clean up uploaded file
         if os.path.exists(input_path):
@@ -55,6 +152,9 @@ def run_pipeline_task(input_path, template_path, output_path, task_id):
 
 @app.route('/upload', methods=['POST'])
 def upload():
+    # Blender and the template were validated at startup; refuse work until then
+    if not readiness.ready:
+        return jsonify({'error': 'Server is not ready', 'readiness': readiness.snapshot()}), 503
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     file = request.files['file']
@@ -64,59 +164,133 @@ def upload():
     if ext not in ALLOWED_EXT:
         return jsonify({'error': f'Unsupported file type. Allowed: {ALLOWED_EXT}'}), 400
 
-    data = file.read()
-    if len(data) > MAX_FILE_SIZE:
-        return jsonify({'error': f'File too large (max {MAX_FILE_SIZE//1024//1024}MB)'}), 400
+    # Per-job overrides of pipeline.RIG_OPTIONS
+    options = {}
+    skinning = request.form.get('skinning', pipeline.RIG_OPTIONS['skinning'])
+    if skinning not in pipeline.SKINNING_METHODS:
+        return jsonify({'error': f'Unknown skinning method. Allowed: {list(pipeline.SKINNING_METHODS)}'}), 400
+    # SciPy is optional in Blender's Python; the startup probe records whether it is there
+    if skinning == 'bone_heat' and not readiness.feature('bone_heat'):
+        return jsonify({'error': "Skinning method 'bone_heat' needs SciPy in Blender's Python; "
+                                 "run install.py or use 'template'."}), 400
+    if skinning != pipeline.RIG_OPTIONS['skinning']:
+        options['skinning'] = skinning
+    # Execution-only: changes ICP memory use, never the task ID
+    if 'memory_budget_mb' in request.form:
+        try:
+            budget = int(request.form['memory_budget_mb'])
+        except ValueError:
+            budget = 0
+        if budget <= 0:
+            return jsonify({'error': 'memory_budget_mb must be a positive integer'}), 400
+        options['memory_budget_mb'] = budget
 
-    file_hash = get_file_hash(data)
-    cached_path = os.path.join(OUTPUT_FOLDER, f"{file_hash}.glb")
-    if os.path.exists(cached_path):
-        logger.info(f"Cache hit for hash {file_hash}")
-        task_id = str(uuid.uuid4())
-        tasks[task_id] = {'status': 'SUCCESS', 'output': cached_path}
-        return jsonify({'task_id': task_id})
+    try:
+        template_hash = hash_file(TEMPLATE_PATH)
+    except FileNotFoundError:
+        logger.error("Template file missing: human.glb")
+        return jsonify({'error': 'Template not found. Please run convert_templates.py first.'}), 503
 
-    # Save uploaded file
-    input_filename = f"{uuid.uuid4()}.{ext}"
-    input_path = os.path.join(UPLOAD_FOLDER, input_filename)
-    with open(input_path, 'wb') as f:
-        f.write(data)
+    # Save uploaded file (streamed; hashed on the way to disk)
+    limit = MAX_SCAN_FILE_SIZE if ext in SCAN_EXT else MAX_FILE_SIZE
+    input_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4()}.{ext}")
+    file_hash = save_upload(file, input_path, limit)
+    if file_hash is None:
+        return jsonify({'error': f'File too large (max {limit//1024//1024}MB)'}), 400
 
-    # Use template (human.glb by default)
-    template_path = os.path.join(TEMPLATE_FOLDER, 'human.glb')
-    if not os.path.exists(template_path):
-        logger.error("Template file missing: human.glb")
-        return jsonify({'error': 'Template not found. Please run convert_templates.py first.'}), 500
+    task_id = get_task_id(file_hash, template_hash, options)
+    cached_path = os.path.join(OUTPUT_FOLDER, f"{task_id}.glb")
+    if os.path.exists(cached_path):
+        # No record needed: lookup_task() resolves the task ID to the cached output
+        logger.info(f"Cache hit for task {task_id}")
+        os.remove(input_path)
+        return jsonify({'task_id': task_id})
 
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = {'status': 'PROCESSING'}
+    cancel_event = tasks.start(task_id)
+    if cancel_event is None:
+        logger.info(f"Task {task_id} already processing")
+        os.remove(input_path)
+        return jsonify({'task_id': task_id})
 
-    # Start pipeline in background thread
-    threading.Thread(target=run_pipeline_task, args=(input_path, template_path, cached_path, task_id)).start()
+    # Queue the pipeline on the worker pool
+    executor.submit(run_pipeline_task, input_path, TEMPLATE_PATH, cached_path, task_id, cancel_event,
+                    options, file_hash)
     return jsonify({'task_id': task_id})
 
+def lookup_task(task_id):
+    """
+    Return (status, output_or_error) for a task, or None if unknown.
+    Falls back to the output cache so expired or cache-hit tasks still resolve.
+    """
+    task = tasks.get(task_id)
+    if task is not None:
+        if task.status == TaskStatus.FAILURE:
+            return task.status, task.error
+        return task.status, task.output
+    if TASK_ID_RE.match(task_id):
+        cached_path = os.path.join(OUTPUT_FOLDER, f"{task_id}.glb")
+        if os.path.exists(cached_path):
+            return TaskStatus.SUCCESS, cached_path
+    return None
+
 @app.route('/status/<task_id>')
 def status(task_id):
-    task = tasks.get(task_id)
+    task = lookup_task(task_id)
     if not task:
         return jsonify({'error': 'Invalid task ID'}), 404
-    if task['status'] == 'SUCCESS':
+    task_status, detail = task
+    if task_status == TaskStatus.SUCCESS:
         return jsonify({'status': 'SUCCESS', 'download_url': f'/download/{task_id}'})
-    elif task['status'] == 'FAILURE':
-        return jsonify({'status': 'FAILURE', 'error': task.get('error', 'Unknown error')})
+    elif task_status == TaskStatus.FAILURE:
+        return jsonify({'status': 'FAILURE', 'error': detail or 'Unknown error'})
+    elif task_status == TaskStatus.CANCELLED:
+        return jsonify({'status': 'CANCELLED'})
     else:
         return jsonify({'status': 'PROCESSING'})
 
 @app.route('/download/<task_id>')
 def download(task_id):
-    task = tasks.get(task_id)
-    if not task or task['status'] != 'SUCCESS':
+    task = lookup_task(task_id)
+    if not task or task[0] != TaskStatus.SUCCESS:
         return jsonify({'error': 'File not ready'}), 404
-    filepath = task['output']
+    filepath = task[1]
     if not os.path.exists(filepath):
         logger.error(f"Download failed: file not found {filepath}")
         return jsonify({'error': 'Rigged file missing on server'}), 500
     return send_file(filepath, as_attachment=True, download_name='rigged.glb')
 
+@app.route('/task/<task_id>', methods=['DELETE'])
+def cancel_task(task_id):
+    """Cancel a processing task, killing its Blender process tree."""
+    cancelled = tasks.cancel(task_id)
+    if not cancelled:
+        # Finished tasks may have no record (cache hit, expired): resolve them like /status
+        task = lookup_task(task_id)
+        if task is None:
+            return jsonify({'error': 'Invalid task ID'}), 404
+        return jsonify({'error': f'Task already finished ({task[0].name})'}), 409
+    metrics.incr('tasks_cancelled')
+    logger.info(f"Task {task_id} cancelled")
+    return jsonify({'status': 'CANCELLED'})
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: startup checks passed and caches are warm."""
+    state = readiness.snapshot()
+    return jsonify(state), (200 if state['ready'] else 503)
+
+@app.route('/metrics')
+def get_metrics():
+    return jsonify(metrics.snapshot())
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    debug = True
+    # With the reloader, only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        init_app()
+    app.run(host='0.0.0.0', port=5000, debug=debug)
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""
+Startup validation and warm-up for the rigging server.
+Checks run in a background thread when the server boots, and failed ones
+are retried every RECHECK_INTERVAL seconds; the server only reports ready
+(/readyz) once every check has passed, so a load balancer never routes jobs
+to a node that would fail or start cold, and a node fixed after boot (e.g.
+templates converted later) becomes ready without a restart.
+"""
+
+import os
+import threading
+import time
+
+import metrics
+import pipeline
+from artifacts import ArtifactStore, hash_file
+
+BLENDER_PROBE_TIMEOUT = 180   # seconds; the first launch also pays for cold disk caches
+RECHECK_INTERVAL = 30         # seconds between retries of failed checks
+GLB_MAGIC = b'glTF'
+
+# Run inside Blender: proves numpy and the rigger's helper modules import there,
+# and reports whether the optional SciPy (bone-heat skinning) is available
+PROBE_SCRIPT = (
+    "import sys; sys.path.insert(0, {backend!r}); "
+    "import numpy, correspondence, rig_math; "
+    "print('PROBE numpy', numpy.__version__)\n"
+    "try:\n    import scipy, scipy.sparse.linalg; print('PROBE scipy', scipy.__version__)\n"
+    "except ImportError:\n    print('PROBE scipy missing')"
+)
+
+class Readiness:
+    """Thread-safe record of startup check results."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checks = {}
+        self._features = {}
+        self._done = False
+        self.started_at = time.time()
+
+    def record(self, name, ok, detail):
+        with self._lock:
+            self._checks[name] = {'ok': bool(ok), 'detail': detail}
+
+    def record_feature(self, name, available):
+        """Record an optional capability (e.g. 'bone_heat') found by a check."""
+        with self._lock:
+            self._features[name] = bool(available)
+
+    def feature(self, name):
+        with self._lock:
+            return self._features.get(name, False)
+
+    def finish(self):
+        """Mark the first round of checks as complete."""
+        with self._lock:
+            self._done = True
+
+    @property
+    def ready(self):
+        with self._lock:
+            return self._done and all(c['ok'] for c in self._checks.values())
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'ready': self._done and all(c['ok'] for c in self._checks.values()),
+                'complete': self._done,
+                'uptime': round(time.time() - self.started_at, 1),
+                'checks': {name: dict(c) for name, c in self._checks.items()},
+                'features': dict(self._features),
+            }
+
+# ----------------------------------------------------------------------
+# Checks (each returns a detail string or raises)
+# ----------------------------------------------------------------------
+def check_blender(readiness=None):
+    """
+    Launch Blender once: validates the binary and NumPy in its Python, and
+    warms its caches. Records the 'bone_heat' feature (SciPy) on readiness.
+    """
+    cmd = ['blender', '--background', '--factory-startup', '--python-expr',
+           PROBE_SCRIPT.format(backend=pipeline.BASE_DIR)]
+    try:
+        returncode, stdout, stderr = pipeline.run_blender(cmd, BLENDER_PROBE_TIMEOUT, label='startup probe')
+    except FileNotFoundError:
+        raise RuntimeError("Blender not found in PATH.")
+    probed = dict(line.split()[1:3] for line in stdout.splitlines()
+                  if line.startswith('PROBE ') and len(line.split()) >= 3)
+    if 'numpy' in probed:
+        scipy = probed.get('scipy', 'missing')
+        if readiness is not None:
+            readiness.record_feature('bone_heat', scipy != 'missing')
+        return f"numpy {probed['numpy']}, scipy {scipy} in Blender's Python"
+    tail = (stderr or stdout).strip().splitlines()[-1:] or ['no output']
+    raise RuntimeError(f"NumPy is not importable in Blender's Python (exit {returncode}): {tail[0]}. "
+                       f"Run install.py.")
+
+def check_template(template_path):
+    """Validate the template GLB and pull it into the page cache and hash memo."""
+    if not os.path.exists(template_path):
+        raise RuntimeError(f"{os.path.basename(template_path)} missing; run convert_templates.py first.")
+    with open(template_path, 'rb') as f:
+        if f.read(4) != GLB_MAGIC:
+            raise RuntimeError(f"{template_path} is not a binary glTF file.")
+    # Reads the whole file once; later plan_artifacts() calls hit the memo
+    digest = hash_file(template_path)
+    return f"{os.path.getsize(template_path)} bytes, sha256 {digest[:12]}"
+
+def check_artifact_store(store=None):
+    """Make sure the artifact cache is writable before jobs rely on it."""
+    store = store or ArtifactStore()
+    os.makedirs(store.root, exist_ok=True)
+    probe = os.path.join(store.root, f'.probe-{os.getpid()}')
+    with open(probe, 'wb') as f:
+        f.write(b'ok')
+    os.remove(probe)
+    return store.root
+
+def warm_executor(executor, workers):
+    """Spawn every pipeline thread up front instead of on the first jobs."""
+    barrier = threading.Barrier(workers + 1)
+
+    def park():
+        try:
+            barrier.wait(timeout=10)
+        except threading.BrokenBarrierError:
+            pass
+
+    for _ in range(workers):
+        executor.submit(park)
+    try:
+        barrier.wait(timeout=10)
+    except threading.BrokenBarrierError:
+        raise RuntimeError("Pipeline threads did not start.")
+    return f"{workers} pipeline threads"
+
+# ----------------------------------------------------------------------
+# Runner
+# ----------------------------------------------------------------------
+def run_checks(readiness, checks, logger, interval=RECHECK_INTERVAL):
+    """
+    Run (name, fn) checks in order, recording each result, then keep
+    retrying the failed ones every `interval` seconds until all pass.
+    """
+    pending = list(checks)
+    while True:
+        failed = []
+        for name, fn in pending:
+            t0 = time.monotonic()
+            try:
+                detail = fn()
+                readiness.record(name, True, detail)
+                logger.info(f"Startup check {name} ok in {time.monotonic() - t0:.1f}s: {detail}")
+            except Exception as e:
+                readiness.record(name, False, str(e))
+                logger.error(f"Startup check {name} failed: {e}")
+                failed.append((name, fn))
+        readiness.finish()
+        if not failed:
+            metrics.incr('startup_ready')
+            logger.info(f"Server ready after {time.time() - readiness.started_at:.1f}s")
+            return
+        metrics.incr('startup_check_failures', len(failed))
+        pending = failed
+        time.sleep(interval)
+
+def start(readiness, checks, logger):
+    """Run the checks on a daemon thread so /healthz answers immediately."""
+    thread = threading.Thread(target=run_checks, args=(readiness, checks, logger),
+                              name='startup', daemon=True)
+    thread.start()
+    return thread
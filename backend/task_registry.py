@@ -0,0 +1,147 @@
+"""
+Bounded in-memory task registry.
+Keeps one compact record per task (keyed by the upload's content hash),
+expires finished records after a TTL and reports its own memory usage.
+"""
+
+import enum
+import sys
+import threading
+import time
+
+DEFAULT_TTL = 3600          # seconds a finished task stays queryable
+DEFAULT_SWEEP_INTERVAL = 60  # seconds between expiry sweeps
+MAX_ERROR_CHARS = 2000       # keep only the tail of long error messages
+
+class TaskStatus(enum.IntEnum):
+    PROCESSING = 0
+    SUCCESS = 1
+    FAILURE = 2
+    CANCELLED = 3
+
+class TaskRecord:
+    """Single task entry; __slots__ keeps per-record overhead small."""
+    __slots__ = ('status', 'output', 'error', 'expires_at', 'cancel_event')
+
+    def __init__(self, status, output=None, error=None, expires_at=None, cancel_event=None):
+        self.status = status
+        self.output = output
+        self.error = error
+        self.expires_at = expires_at
+        self.cancel_event = cancel_event
+
+class TaskRegistry:
+    """
+    Thread-safe task store with TTL-based expiry.
+    Records in PROCESSING state never expire; finished records are dropped
+    `ttl` seconds after completion by a background sweeper thread.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, sweep_interval=DEFAULT_SWEEP_INTERVAL):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._records = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, task_id):
+        """Return the record for task_id, or None if unknown or expired."""
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is not None and self._expired(record, time.monotonic()):
+                del self._records[task_id]
+                return None
+            return record
+
+    def start(self, task_id):
+        """
+        Mark task_id as processing and return its cancel event,
+        or None if the task is already running.
+        """
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is not None and record.status == TaskStatus.PROCESSING:
+                return None
+            cancel_event = threading.Event()
+            self._records[task_id] = TaskRecord(TaskStatus.PROCESSING, cancel_event=cancel_event)
+            return cancel_event
+
+    def cancel(self, task_id):
+        """
+        Cancel a processing task: signal its cancel event and mark it CANCELLED.
+        Returns True if the task was cancelled by this call, False if it had
+        already finished, or None if it is unknown.
+        """
+        with self._lock:
+            record = self._records.get(task_id)
+            if record is None:
+                return None
+            if record.status != TaskStatus.PROCESSING:
+                return False
+            record.cancel_event.set()
+            self._records[task_id] = TaskRecord(TaskStatus.CANCELLED, expires_at=time.monotonic() + self.ttl)
+            return True
+
+    def succeed(self, task_id, output):
+        """Mark task_id as finished successfully with the given output path."""
+        self._finish(task_id, TaskRecord(TaskStatus.SUCCESS, output=output))
+
+    def fail(self, task_id, error):
+        """Mark task_id as failed, keeping only the tail of the error text."""
+        error = str(error)
+        if len(error) > MAX_ERROR_CHARS:
+            error = '...' + error[-MAX_ERROR_CHARS:]
+        self._finish(task_id, TaskRecord(TaskStatus.FAILURE, error=error))
+
+    def _finish(self, task_id, record):
+        record.expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            current = self._records.get(task_id)
+            # A cancelled task keeps its status even if the worker finishes late
+            if current is not None and current.status == TaskStatus.CANCELLED:
+                return
+            self._records[task_id] = record
+
+    @staticmethod
+    def _expired(record, now):
+        return record.expires_at is not None and record.expires_at <= now
+
+    def sweep(self):
+        """Drop all expired records. Returns the number removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, r in self._records.items() if self._expired(r, now)]
+            for k in expired:
+                del self._records[k]
+        return len(expired)
+
+    def start_sweeper(self):
+        """Start the background expiry thread (idempotent)."""
+        if self._sweeper is not None:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name='task-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
+
+    def memory_usage(self):
+        """Approximate bytes held by the registry (dict, keys and records)."""
+        with self._lock:
+            items = list(self._records.items())
+            total = sys.getsizeof(self._records)
+        for key, record in items:
+            total += sys.getsizeof(key) + sys.getsizeof(record)
+            if record.output is not None:
+                total += sys.getsizeof(record.output)
+            if record.error is not None:
+                total += sys.getsizeof(record.error)
+        return total
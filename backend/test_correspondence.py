@@ -0,0 +1,57 @@
+"""Tests for the correspondence engine against brute-force searches."""
+
+import numpy as np
+import pytest
+
+import correspondence
+
+def brute_surface(points, tris, queries):
+    corners = points[tris]
+    d2, _ = correspondence.closest_point_barycentric(
+        queries[:, None, :], corners[None, :, 0], corners[None, :, 1], corners[None, :, 2])
+    return d2.min(axis=1)
+
+def surface_distance(points, tris, queries, tri, bary):
+    closest = correspondence.interpolate(points[tris[tri]], bary)
+    return ((queries - closest) ** 2).sum(axis=1)
+
+def mixed_surface(seed=0):
+    """A coarse plane of large triangles next to a finely tessellated bump."""
+    rng = np.random.default_rng(seed)
+    big = np.array([[-2, -2, 0], [2, -2, 0], [2, 2, 0], [-2, 2, 0]], float)
+    big_tris = np.array([[0, 1, 2], [0, 2, 3]])
+    g = np.linspace(0, 0.5, 12)
+    xx, yy = np.meshgrid(g, g)
+    fine = np.c_[xx.ravel() + 1.0, yy.ravel() + 1.0, 0.3 + 0.05 * rng.random(xx.size)]
+    i = np.arange(11)[:, None] * 12 + np.arange(11)[None, :]
+    fine_tris = np.r_[np.c_[i.ravel(), i.ravel() + 1, i.ravel() + 12],
+                      np.c_[i.ravel() + 1, i.ravel() + 13, i.ravel() + 12]] + len(big)
+    return np.r_[big, fine], np.r_[big_tris, fine_tris]
+
+def test_large_triangle_beats_nearer_vertex():
+    # The nearest vertex belongs to the small triangle, the closest surface point does not
+    points = np.array([[-10, -10, 0], [10, -10, 0], [0, 10, 0],
+                       [0, 0, 0.5], [0.1, 0, 0.5], [0, 0.1, 0.5]], float)
+    tris = np.array([[0, 1, 2], [3, 4, 5]])
+    tri, bary = correspondence.nearest_surface(points, tris, np.array([[0.0, 0.0, 0.1]]))
+    assert tri[0] == 0
+    assert surface_distance(points, tris, np.array([[0.0, 0.0, 0.1]]), tri, bary)[0] == pytest.approx(0.01)
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_nearest_surface_matches_brute_force(workers, monkeypatch):
+    monkeypatch.setattr(correspondence, 'PARALLEL_MIN_QUERIES', 0)
+    points, tris = mixed_surface()
+    queries = np.random.default_rng(1).uniform([-2.5, -2.5, -0.5], [2.5, 2.5, 1.0], (3000, 3))
+    tri, bary = correspondence.nearest_surface(points, tris, queries, workers=workers, chunk_size=500)
+    np.testing.assert_allclose(surface_distance(points, tris, queries, tri, bary),
+                               brute_surface(points, tris, queries), rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(bary.sum(axis=1), 1.0)
+
+def test_nearest_vertices_matches_brute_force():
+    rng = np.random.default_rng(2)
+    source = rng.normal(size=(5000, 3)) * [3.0, 1.0, 0.1]
+    queries = rng.normal(size=(2000, 3))
+    index, d2 = correspondence.nearest_vertices(source, queries)
+    expected = ((queries[:, None, :] - source[None, :, :]) ** 2).sum(axis=2).min(axis=1)
+    np.testing.assert_allclose(d2, expected, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(((queries - source[index]) ** 2).sum(axis=1), expected, rtol=1e-9, atol=1e-12)
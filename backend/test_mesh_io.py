@@ -0,0 +1,66 @@
+"""Tests for the memory-mapped PLY reader on meshes that mix polygon sizes."""
+
+import numpy as np
+import pytest
+
+import mesh_io
+
+def write_ply(path, fmt, verts, faces):
+    header = (f"ply\nformat {fmt} 1.0\nelement vertex {len(verts)}\n"
+              "property float x\nproperty float y\nproperty float z\n"
+              f"element face {len(faces)}\nproperty list uchar int vertex_indices\nend_header\n")
+    with open(path, 'wb') as f:
+        f.write(header.encode())
+        if fmt == 'ascii':
+            f.write(''.join(f"{x} {y} {z}\n" for x, y, z in verts).encode())
+            f.write(''.join(f"{len(face)} {' '.join(map(str, face))}\n" for face in faces).encode())
+        else:
+            f.write(np.asarray(verts, '<f4').tobytes())
+            for face in faces:
+                f.write(bytes([len(face)]) + np.asarray(face, '<i4').tobytes())
+
+def expected_triangles(faces):
+    return np.array([[face[0], face[i], face[i + 1]] for face in faces for i in range(1, len(face) - 1)])
+
+def mixed_faces(n_faces, n_verts, seed=0):
+    rng = np.random.default_rng(seed)
+    # Alternating triangles and quads, then a few long runs and an n-gon
+    sizes = [3 + i % 2 for i in range(n_faces)] + [3] * 50 + [4] * 70 + [6]
+    return [list(rng.integers(0, n_verts, k)) for k in sizes]
+
+@pytest.mark.parametrize('fmt', ['ascii', 'binary_little_endian'])
+def test_mixed_polygon_sizes(tmp_path, fmt):
+    verts = np.random.default_rng(1).random((100, 3)).astype(np.float32)
+    faces = mixed_faces(500, len(verts))
+    path = tmp_path / 'mixed.ply'
+    write_ply(path, fmt, verts, faces)
+
+    mesh = mesh_io.read_ply(str(path))
+    primitive = mesh.primitives[0]
+    np.testing.assert_allclose(primitive.attributes['POSITION'], verts, rtol=1e-6)
+    np.testing.assert_array_equal(primitive.indices.reshape(-1, 3), expected_triangles(faces))
+
+def test_polygon_runs_work_is_linear():
+    # Records inspected by _polygon_runs must stay proportional to the face count
+    # even when the polygon size changes after every face
+    sizes = np.array([3 + i % 2 for i in range(20000)] + [3] * 30000)
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    inspected = []
+
+    def parse_run(pos, k, limit):
+        counts = sizes[pos:pos + limit]
+        inspected.append(len(counts))
+        run = np.zeros((len(counts), k), np.int64)
+        return counts, run, lambda m: pos + m
+
+    result, corners, end = mesh_io._polygon_runs(lambda pos: int(sizes[pos]), parse_run, len(sizes))
+    np.testing.assert_array_equal(result, sizes)
+    assert len(corners) == offsets[-1] and end == len(sizes)
+    assert sum(inspected) <= mesh_io.FACE_RUN_WINDOW + 2 * mesh_io.FACE_RUN_MIN * len(sizes)
+
+def test_ascii_face_count_mismatch(tmp_path):
+    path = tmp_path / 'bad.ply'
+    write_ply(path, 'ascii', np.zeros((4, 3)), [[0, 1, 2, 3]])
+    path.write_bytes(path.read_bytes().replace(b'4 0 1 2 3', b'4 0 1 2'))
+    with pytest.raises(mesh_io.UnsupportedMesh):
+        mesh_io.read_ply(str(path))